@@ -1,20 +1,108 @@
+import asyncio
 import os
-from typing import Any
-from fastapi import APIRouter, HTTPException, Depends
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+import numpy as np
+import orjson
+import redis.asyncio as aioredis
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi_limiter.depends import RateLimiter
 from celery.result import AsyncResult
+from celery.states import READY_STATES, SUCCESS
 from celery import chain
 from app.api.schemas import SearchRequest, SearchResponse, TaskResponse
 from app.worker import scrape_task, embed_task
+from app.utils.cache import task_channel
 from app.utils.logger import logger
+from app.utils.vectors import pack_binary, quantize_int8, unpack_f16
 
 router: APIRouter = APIRouter()
 
 RATE_LIMIT_TIMES = int(os.getenv("RATE_LIMIT_TIMES", "5"))
 RATE_LIMIT_SECONDS = int(os.getenv("RATE_LIMIT_SECONDS", "60"))
+# Long-poll: the longest a status request may be held open
+MAX_TASK_WAIT = 30.0
+# Held requests wake on the worker's completion notification and recheck the
+# result backend every TASK_RECHECK_INTERVAL; without pub/sub they poll every TASK_WAIT_INTERVAL
+TASK_RECHECK_INTERVAL = 1.0
+TASK_WAIT_INTERVAL = 0.5
+# Stream: how long /tasks/{id}/stream stays open
+MAX_STREAM_WAIT = 60.0
+
+_pubsub_client: Optional[aioredis.Redis] = None
+
+def get_pubsub_client() -> aioredis.Redis:
+    """Lazily creates the shared async Redis client used for task notifications."""
+    global _pubsub_client
+    if _pubsub_client is None:
+        _pubsub_client = aioredis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return _pubsub_client
+
+async def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the app-wide pooled HTTP client created in the lifespan."""
+    return request.app.state.http_client
+
+def expand_embeddings(result_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns packed float16 embeddings back into float lists when the client asked for them."""
+    if result_data.pop("expand_embeddings", False):
+        for res in result_data.get("organic_results", []):
+            packed = res.pop("embedding_b16", None)
+            if packed:
+                res["embedding"] = unpack_f16(packed)
+    precision = result_data.pop("embedding_precision", None)
+    if precision:
+        quantize_embeddings(result_data, precision)
+    return result_data
+
+def quantize_embeddings(result_data: Dict[str, Any], precision: str) -> None:
+    """Replaces packed float16 embeddings with int8 or sign-bit encodings in place."""
+    embedded = [res for res in result_data.get("organic_results", []) if res.get("embedding_b16")]
+    if not embedded:
+        return
+    vectors = np.array([unpack_f16(res.pop("embedding_b16")) for res in embedded], dtype=np.float32)
+    if precision == "int8":
+        # One scale and zero point for the whole response keeps rows comparable
+        values, scale, zero_point = quantize_int8(vectors)
+        for res, packed in zip(embedded, values):
+            res["embedding_q"] = {"values": packed, "scale": scale, "zero_point": zero_point}
+    else:
+        for res, vec in zip(embedded, vectors):
+            res["embedding_q"] = {"values": pack_binary(vec)}
+
+async def wait_until_ready(task_id: str, task_result: AsyncResult, wait: float) -> None:
+    """Holds the request until the task is ready or wait seconds have passed.
+
+    ready() queries the database result backend, so it runs in a thread rather
+    than on the event loop, and only when a notification or recheck is due.
+    """
+    deadline = time.monotonic() + wait
+    pubsub = get_pubsub_client().pubsub()
+    try:
+        # Subscribe before checking readiness so a completion in between is not missed
+        await pubsub.subscribe(task_channel(task_id))
+        while not await asyncio.to_thread(task_result.ready):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # The periodic recheck also covers chains that fail before score_task publishes
+            await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=min(TASK_RECHECK_INTERVAL, remaining)
+            )
+    except Exception as e:
+        logger.error("Task wait pub/sub error: %s", e)
+        await poll_until_ready(task_result, deadline)
+    finally:
+        await pubsub.aclose()
+
+async def poll_until_ready(task_result: AsyncResult, deadline: float) -> None:
+    """Polls readiness every TASK_WAIT_INTERVAL until the task is ready or the monotonic deadline passes."""
+    while not await asyncio.to_thread(task_result.ready) and time.monotonic() < deadline:
+        await asyncio.sleep(TASK_WAIT_INTERVAL)
 
 @router.post("/search", response_model=TaskResponse, status_code=202, dependencies=[Depends(RateLimiter(times=RATE_LIMIT_TIMES, seconds=RATE_LIMIT_SECONDS))])
-async def search_endpoint(request: SearchRequest) -> TaskResponse:
+async def search_endpoint(request: SearchRequest) -> ORJSONResponse:
     try:
         # Chain the tasks: Scrape -> Embed -> Score
         from app.worker import scrape_task, embed_task, score_task
@@ -37,40 +125,81 @@ async def search_endpoint(request: SearchRequest) -> TaskResponse:
 
         task = task_chain.apply_async()
 
-        return TaskResponse(
-            task_id=task.id,
-            status="pending"
+        return ORJSONResponse(
+            content=TaskResponse(task_id=task.id, status="pending").to_dict(),
+            status_code=202
         )
 
     except Exception as e:
         logger.error("Search endpoint error: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error") from e
 
+def build_task_response(task_id: str, task_result: AsyncResult, status_only: bool = False) -> TaskResponse:
+    # Read the state once and derive readiness from it instead of querying the
+    # database result backend again; a ready state is cached on the AsyncResult,
+    # so get() and .result below do not go back to the database either.
+    state = task_result.status
+    response = TaskResponse(
+        task_id=task_id,
+        status=state.lower()
+    )
+
+    if state not in READY_STATES:
+        return response
+
+    if status_only:
+        # Cheap poll: report readiness without loading the result payload.
+        # A "completed" task may still carry a pipeline error; fetch the full
+        # body to find out.
+        response.status = "completed" if state == SUCCESS else "failed"
+        return response
+
+    if state == SUCCESS:
+        result_data = task_result.get()
+        if "error" in result_data:
+            response.status = "failed"
+            response.error = result_data["error"]
+        else:
+            response.status = "completed"
+            response.result = SearchResponse.from_trusted(expand_embeddings(result_data), cached=False)
+    else:
+        response.status = "failed"
+        response.error = str(task_result.result)
+
+    return response
+
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
-async def get_task_status(task_id: str) -> TaskResponse:
+async def get_task_status(
+    task_id: str,
+    status_only: bool = False,
+    wait: float = Query(0.0, ge=0.0, le=MAX_TASK_WAIT)
+) -> ORJSONResponse:
     try:
         task_result = AsyncResult(task_id)
+        if wait:
+            # Long-poll: one held request replaces a series of short polls
+            await wait_until_ready(task_id, task_result, wait)
 
-        response = TaskResponse(
-            task_id=task_id,
-            status=task_result.status.lower()
-        )
-
-        if task_result.ready():
-            if task_result.successful():
-                result_data = task_result.get()
-                if "error" in result_data:
-                    response.status = "failed"
-                    response.error = result_data["error"]
-                else:
-                    response.status = "completed"
-                    response.result = SearchResponse(**result_data, cached=False)
-            else:
-                response.status = "failed"
-                response.error = str(task_result.result)
-
-        return response
+        # State and result reads go to the result backend; keep them off the event loop
+        response = await asyncio.to_thread(build_task_response, task_id, task_result, status_only)
+        return ORJSONResponse(content=response.to_dict())
 
     except Exception as e:
         logger.error("Task status error: %s", e)
         raise HTTPException(status_code=500, detail=str(e)) from e
+
+@router.get("/tasks/{task_id}/stream")
+async def stream_task_status(task_id: str, status_only: bool = False) -> StreamingResponse:
+    """Server-sent events: a single frame with the task status once it is ready or the wait lapses."""
+    async def events() -> AsyncIterator[bytes]:
+        task_result = AsyncResult(task_id)
+        # Any failure, including while waiting, still ends the stream with one frame
+        try:
+            await wait_until_ready(task_id, task_result, MAX_STREAM_WAIT)
+            response = await asyncio.to_thread(build_task_response, task_id, task_result, status_only)
+        except Exception as e:
+            logger.error("Task status error: %s", e)
+            response = TaskResponse(task_id=task_id, status="failed", error=str(e))
+        yield b"data: " + orjson.dumps(response.to_dict()) + b"\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,5 +1,19 @@
 from typing import Optional, List, Dict, Union, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class ResponseModel(BaseModel):
+    """Base for API payloads; null fields are dropped when serialized."""
+
+    # Validators are built on first use rather than at import, and unknown
+    # keys from worker results are dropped without a validation error.
+    model_config = ConfigDict(defer_build=True, extra="ignore")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.model_dump(mode="json", exclude_none=True)
+
+    def to_json(self) -> str:
+        return self.model_dump_json(exclude_none=True)
 
 class SearchRequest(BaseModel):
     query: str
@@ -9,15 +23,31 @@ class SearchRequest(BaseModel):
     mode: Optional[str] = "search"
     limit: Optional[int] = 10
 
-class OrganicResult(BaseModel):
+class QuantizedEmbedding(ResponseModel):
+    """Base64 int8 or sign-bit embedding; int8 values decode as (q + 128) * scale + zero_point."""
+    values: str
+    scale: Optional[float] = None
+    zero_point: Optional[float] = None
+
+class OrganicResult(ResponseModel):
     title: str
     url: str
     snippet: str
     score: Optional[float] = 0.0
     full_content: Optional[str] = None
     embedding: Optional[List[float]] = None
+    embedding_b16: Optional[str] = None
+    embedding_q: Optional[QuantizedEmbedding] = None
+
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]) -> "OrganicResult":
+        """Builds a result from pipeline output without re-validating it."""
+        quantized = data.get("embedding_q")
+        if quantized is not None:
+            data = {**data, "embedding_q": QuantizedEmbedding.model_construct(**quantized)}
+        return cls.model_construct(**data)
 
-class SearchResponse(BaseModel):
+class SearchResponse(ResponseModel):
     query: str
     ai_overview: Optional[str] = None
     organic_results: List[OrganicResult] = []
@@ -29,7 +59,17 @@ class SearchResponse(BaseModel):
     credibility_reasoning: Optional[str] = None
     cached: bool
 
-class TaskResponse(BaseModel):
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any], cached: bool) -> "SearchResponse":
+        """Builds a response from worker output without re-validating it.
+
+        The worker assembled these fields itself, so the task status path skips
+        pydantic validation; unknown keys are still dropped.
+        """
+        organic = [OrganicResult.from_trusted(res) for res in data.get("organic_results", [])]
+        return cls.model_construct(**{**data, "organic_results": organic}, cached=cached)
+
+class TaskResponse(ResponseModel):
     task_id: str
     status: str
     result: Optional[SearchResponse] = None
@@ -1,6 +1,8 @@
 from typing import AsyncGenerator
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+import orjson
 import os
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "user")
@@ -14,7 +16,23 @@ DATABASE_URL: str = os.getenv(
     f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
-engine: AsyncEngine = create_async_engine(DATABASE_URL, echo=False)
+# Connections kept per process, and the burst allowed above that under concurrent saves
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_RECYCLE = 1800
+
+engine: AsyncEngine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    # asyncpg keeps this many prepared statements per connection
+    connect_args={"statement_cache_size": 512} if DATABASE_URL.startswith("postgresql+asyncpg") else {},
+    # The JSON embedding column goes through orjson instead of stdlib json
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=orjson.loads
+)
 
 AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -27,5 +45,8 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 async def init_db() -> None:
+    from app.db.models import Vector
     async with engine.begin() as conn:
+        if Vector is not None and engine.dialect.name == "postgresql":
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         await conn.run_sync(Base.metadata.create_all)
@@ -1,7 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, DateTime
+from sqlalchemy import Column, Index, Integer, String, Text, Float, JSON, DateTime
 from sqlalchemy.sql import func
 from app.db.database import Base
 
+try:
+    from pgvector.sqlalchemy import Vector
+except ImportError:
+    Vector = None  # Without pgvector, embeddings fall back to a JSON column
+
+# Output size of the all-MiniLM-L6-v2 embedding model
+EMBEDDING_DIM = 384
+
 class SearchResult(Base):
     __tablename__ = "search_results"
 
@@ -11,5 +19,16 @@ class SearchResult(Base):
     title = Column(String)
     snippet = Column(Text)
     score = Column(Float)
-    embedding = Column(JSON, nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIM) if Vector else JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    if Vector:
+        # HNSW index for cosine nearest-neighbour lookups over stored embeddings
+        __table_args__ = (
+            Index(
+                "ix_search_results_embedding_hnsw",
+                embedding,
+                postgresql_using="hnsw",
+                postgresql_ops={"embedding": "vector_cosine_ops"}
+            ),
+        )
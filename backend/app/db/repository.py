@@ -1,21 +1,31 @@
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import SearchResult
+from app.utils.vectors import unpack_f16
 from typing import List, Dict
 
 async def save_search_results(session: AsyncSession, query: str, results: List[Dict]):
     """
-    Saves a list of dictionary results to the database.
-    Each result dict should have: title, url, snippet, score, embedding (optional).
+    Saves a list of dictionary results to the database in one multi-row INSERT.
+    Each result dict should have: title, url, snippet, score, embedding or embedding_b16 (optional).
     """
+    rows = []
     for res in results:
-        db_item = SearchResult(
-            query=query,
-            url=res.get("url"),
-            title=res.get("title"),
-            snippet=res.get("snippet"),
-            score=res.get("score", 0.0),
-            embedding=res.get("embedding")
-        )
-        session.add(db_item)
+        embedding = res.get("embedding")
+        if embedding is None and res.get("embedding_b16"):
+            embedding = unpack_f16(res["embedding_b16"])
 
+        rows.append({
+            "query": query,
+            "url": res.get("url"),
+            "title": res.get("title"),
+            "snippet": res.get("snippet"),
+            "score": res.get("score", 0.0),
+            "embedding": embedding
+        })
+
+    if not rows:
+        return
+
+    await session.execute(insert(SearchResult), rows)
     await session.commit()
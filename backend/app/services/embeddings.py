@@ -1,10 +1,39 @@
-from typing import List, Optional
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Dict, List, Optional
+import numpy as np
+from app.utils.cache import cache
 from app.utils.logger import logger
 
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_CACHE_TTL = 7 * 24 * 60 * 60
+LOCAL_CACHE_SIZE = 10_000
+# "onnx" runs the encoder on ONNX Runtime; "torch" keeps the eager PyTorch model
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx").lower()
+# Dynamic int8 quantization target for the ONNX encoder ("avx512_vnni", "avx2",
+# "arm64"); "none" keeps the FP32 ONNX graph
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx512_vnni").lower()
+# The quantized model is exported here once and reused on later boots
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", os.path.expanduser("~/.cache/flux/models"))
+# Each prefork worker process runs its own encoder; splitting the cores between
+# them keeps the intra-op thread pools (ONNX Runtime or torch) from oversubscribing
+EMBEDDING_WORKER_CONCURRENCY = max(1, int(os.getenv("EMBEDDING_WORKER_CONCURRENCY", "1")))
+EMBEDDING_THREADS = int(os.getenv(
+    "EMBEDDING_THREADS", str(max(1, (os.cpu_count() or 1) // EMBEDDING_WORKER_CONCURRENCY))
+))
+
 class EmbeddingsService:
     def __init__(self):
         self.model = None
         self.model_name = "all-MiniLM-L6-v2"
+        # Which runtime and precision produced the vectors; part of the cache key
+        # so int8, FP32 and fp16 vectors never share entries
+        self.variant = EMBEDDING_BACKEND
+        # Process-local LRU in front of Redis for the hottest snippets
+        self._local_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
 
     def _load_model(self):
         if self.model is not None:
@@ -12,8 +41,8 @@ class EmbeddingsService:
 
         try:
             from sentence_transformers import SentenceTransformer
-            logger.info("Loading embedding model: %s...", self.model_name)
-            self.model = SentenceTransformer(self.model_name)
+            logger.info("Loading embedding model: %s (%s backend)...", self.model_name, EMBEDDING_BACKEND)
+            self.model = self._build_model(SentenceTransformer)
             logger.info("Embedding model loaded successfully.")
         except ImportError:
             logger.warning("sentence-transformers not installed. Vector output will be disabled.")
@@ -22,23 +51,167 @@ class EmbeddingsService:
             logger.error("Failed to load embedding model: %s", e)
             self.model = False
 
+    def warmup(self) -> bool:
+        """Loads the model and runs one encode so the first task skips the cold start."""
+        self._load_model()
+        if not self.model:
+            return False
+        self._encode(["warmup"])
+        return True
+
+    def _build_model(self, factory):
+        if EMBEDDING_BACKEND == "onnx":
+            if EMBEDDING_QUANTIZATION != "none":
+                try:
+                    model = self._load_quantized(factory)
+                    self.variant = f"onnx-int8_{EMBEDDING_QUANTIZATION}"
+                    return model
+                except Exception as e:
+                    logger.warning("Quantized ONNX model unavailable (%s). Using the FP32 ONNX graph.", e)
+            try:
+                model = factory(self.model_name, backend="onnx", model_kwargs=self._onnx_model_kwargs())
+                self.variant = "onnx"
+                return model
+            except Exception as e:
+                logger.warning("ONNX backend unavailable (%s). Falling back to PyTorch.", e)
+
+        model = factory(self.model_name)
+        self.variant = "torch"
+        try:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+            if torch.cuda.is_available():
+                # fp16 weights halve memory traffic through the matmuls on GPU;
+                # outputs are narrowed to float16 anyway
+                model = model.half()
+                self.variant = "torch-fp16"
+        except ImportError:
+            pass
+        return model
+
+    def _load_quantized(self, factory):
+        """Loads the int8 ONNX encoder, exporting it on the first boot."""
+        model_dir = os.path.join(EMBEDDING_MODEL_DIR, self.model_name)
+        suffix = f"int8_{EMBEDDING_QUANTIZATION}"
+        file_name = f"onnx/model_{suffix}.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            logger.info("Exporting %s int8 ONNX model to %s...", EMBEDDING_QUANTIZATION, model_dir)
+            self._export_quantized(factory, model_dir, suffix, file_name)
+        return factory(model_dir, backend="onnx", model_kwargs=self._onnx_model_kwargs(file_name=file_name))
+
+    @staticmethod
+    def _onnx_model_kwargs(**kwargs) -> Dict:
+        """Adds ONNX Runtime session options capping intra-op threads at EMBEDDING_THREADS."""
+        try:
+            import onnxruntime
+        except ImportError:
+            # The ONNX load fails without it and falls back to torch
+            return kwargs
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = EMBEDDING_THREADS
+        return {**kwargs, "session_options": options}
+
+    def _export_quantized(self, factory, model_dir: str, suffix: str, file_name: str) -> None:
+        """Exports into a private staging directory and moves the result into place.
+
+        Worker processes warm up concurrently, so the quantized graph only ever
+        appears at model_dir through an atomic rename, never half-written.
+        """
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        os.makedirs(EMBEDDING_MODEL_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".export-", dir=EMBEDDING_MODEL_DIR)
+        try:
+            model = factory(self.model_name, backend="onnx")
+            model.save(staging)
+            export_dynamic_quantized_onnx_model(model, EMBEDDING_QUANTIZATION, staging, file_suffix=suffix)
+            try:
+                # First export publishes the whole model directory in one rename
+                os.rename(staging, model_dir)
+            except OSError:
+                # model_dir already exists (another process or quantization target);
+                # publish just this graph next to its tokenizer and config
+                os.makedirs(os.path.join(model_dir, "onnx"), exist_ok=True)
+                os.replace(os.path.join(staging, file_name), os.path.join(model_dir, file_name))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _cache_key(self, text: str) -> str:
+        digest = blake2b(f"{self.model_name}\0{self.variant}\0{text}".encode(), digest_size=16).hexdigest()
+        return f"emb:{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._local_cache[key] = vector
+        self._local_cache.move_to_end(key)
+        if len(self._local_cache) > LOCAL_CACHE_SIZE:
+            self._local_cache.popitem(last=False)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Returns L2-normalized float16 vectors in input order."""
+        # Encode in length-sorted order so each batch pads to a similar
+        # sequence length, then scatter rows back to the caller's order.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        encoded = np.asarray(self.model.encode(  # type: ignore[union-attr]
+            [texts[i] for i in order],
+            batch_size=EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+            normalize_embeddings=True
+        ), dtype=np.float16)
+        embeddings = np.empty(encoded.shape, dtype=np.float16)
+        embeddings[order] = encoded
+        return embeddings
+
     def generate(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.generate_array(texts)
+        if vectors is None:
+            return []
+        result = vectors.astype(np.float32).tolist()
+        if isinstance(result, list):
+            return result
+        return []
+
+    def generate_array(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Returns an (n, dim) float16 matrix for texts, or None on failure."""
         if self.model is None:
             self._load_model()
 
         if not self.model: # Handle case where model failed to load or is missing
             logger.error("Embedding model is not loaded.")
-            return []
+            return None
+
+        if not texts:
+            return None
 
         try:
-            embeddings = self.model.encode(texts)
-            if hasattr(embeddings, "tolist"):
-                result = embeddings.tolist()
-                if isinstance(result, list):
-                    return result
-            return []
+            keys = [self._cache_key(t) for t in texts]
+            vectors: List[Optional[np.ndarray]] = [self._local_cache.get(k) for k in keys]
+
+            remote = [i for i, v in enumerate(vectors) if v is None]
+            if remote:
+                for i, raw in zip(remote, cache.get_many([keys[i] for i in remote])):
+                    if raw:
+                        vectors[i] = np.frombuffer(raw, dtype=np.float16)
+                        self._remember(keys[i], vectors[i])
+
+            # Encode each distinct missing snippet once
+            missing: Dict[str, List[int]] = {}
+            for i, v in enumerate(vectors):
+                if v is None:
+                    missing.setdefault(keys[i], []).append(i)
+
+            if missing:
+                encoded = self._encode([texts[idx[0]] for idx in missing.values()])
+                fresh: Dict[str, bytes] = {}
+                for (key, indices), vec in zip(missing.items(), encoded):
+                    for i in indices:
+                        vectors[i] = vec
+                    self._remember(key, vec)
+                    fresh[key] = vec.tobytes()
+                cache.set_many(fresh, EMBEDDING_CACHE_TTL)
+
+            return np.vstack(vectors)
         except Exception as e:
             logger.error("Error generating embeddings: %s", e)
-            return []
+            return None
 
 embeddings_service = EmbeddingsService()
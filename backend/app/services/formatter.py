@@ -1,9 +1,20 @@
+import re
 from typing import Dict, List, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
 from app.utils.logger import logger
 
+# One match per whitespace-delimited word, as str.split() counts them
+_WORD_RE = re.compile(r"\S+")
+
+def score_label(score: float) -> str:
+    return f"(Credibility Score: {score})" if score > 0 else ""
+
 class FormatterService:
+    def __init__(self):
+        # Stateless, so one instance serves every request without refitting a vocabulary
+        self._vectorizer = HashingVectorizer(n_features=2 ** 14, alternate_sign=False, norm="l2")
+
     def format_response(self, query: str, parsed_data: Dict) -> Dict:
         organic = parsed_data.get("organic_results", [])
         ai_overview = parsed_data.get("ai_overview")
@@ -30,25 +41,38 @@ class FormatterService:
             return results
 
         try:
+            # Exact repeats (after normalizing case and whitespace) are dropped with
+            # a set lookup; empty snippets carry no text to compare and are all kept
+            seen = set()
+            distinct: List[Dict] = []
+            for r in results:
+                key = " ".join((r.get("snippet") or "").lower().split())
+                if key:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                distinct.append(r)
+            results = distinct
+
             snippets = [r.get("snippet", "") for r in results]
-            if all(not s.strip() for s in snippets):
+            if len(seen) < 2:
+                # Nothing left that could be a near-copy of another snippet
                 return results
 
-            vectorizer = TfidfVectorizer().fit_transform(snippets)
-            vectors = vectorizer.toarray()
+            # Hashed term-frequency rows are L2-normalized, so one sparse matmul
+            # gives every pairwise cosine similarity
+            counts = self._vectorizer.transform(snippets)
+            sim = (counts @ counts.T).toarray()
 
             kept_indices: List[int] = []
+            duplicate = np.zeros(len(results), dtype=bool)
 
             for i in range(len(results)):
-                is_duplicate = False
-                for j in kept_indices:
-                    sim = cosine_similarity([vectors[i]], [vectors[j]])[0][0]
-                    if sim > threshold:
-                        is_duplicate = True
-                        break
-
-                if not is_duplicate:
-                    kept_indices.append(i)
+                if duplicate[i]:
+                    continue
+                kept_indices.append(i)
+                # A kept result marks every later near-copy as a duplicate
+                duplicate[i + 1:] |= sim[i, i + 1:] > threshold
 
             return [results[i] for i in kept_indices]
 
@@ -57,28 +81,29 @@ class FormatterService:
             return results
 
     def _generate_markdown(self, query: str, ai_overview: Optional[str], results: List[Dict]) -> str:
-        md = [f"# Search Results for: {query}\n"]
+        sections = [f"# Search Results for: {query}\n"]
 
         if ai_overview:
-            md.append(f"## AI Overview\n{ai_overview}\n")
-            md.append("---\n")
+            sections.append(f"## AI Overview\n{ai_overview}\n\n---\n")
 
         sorted_results = sorted(results, key=lambda x: x.get("score", 0.0), reverse=True)
 
-        for idx, res in enumerate(sorted_results, 1):
-            score = res.get("score", 0.0)
-            score_label = f"(Credibility Score: {score})" if score > 0 else ""
-
-            md.append(f"### {idx}. {res.get('title', 'No Title')} {score_label}")
-            md.append(f"URL: {res.get('url', 'No URL')}")
-            
-            content = res.get('full_content') or res.get('snippet', '')
-            md.append(f"Content: {content}\n")
+        # One formatted block per result, joined once
+        sections.extend(
+            f"### {idx}. {res.get('title', 'No Title')} {score_label(res.get('score', 0.0))}\n"
+            f"URL: {res.get('url', 'No URL')}\n"
+            f"Content: {res.get('full_content') or res.get('snippet', '')}\n"
+            for idx, res in enumerate(sorted_results, 1)
+        )
 
-        return "\n".join(md)
+        return "\n".join(sections)
 
     def _estimate_tokens(self, text: str) -> int:
-        word_count = len(text.split())
+        if not text:
+            return 0
+        # Blank lines, rules and trailing spaces are not words, so count word runs
+        # rather than separators
+        word_count = len(_WORD_RE.findall(text))
         return int(word_count * 1.3)
 
 formatter = FormatterService()
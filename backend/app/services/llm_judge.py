@@ -1,11 +1,16 @@
 import os
-import json
+import re
 import httpx
+import orjson
 import asyncio
 from typing import List, Dict, Any, Optional
 from app.utils.logger import logger
 
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Snippet tails add tokens (cost/latency) without changing the judgement
+MAX_SNIPPET_CHARS = 300
+# Body of a markdown code fence; an unterminated fence runs to the end
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.S)
 
 class LLMJudgeService:
     def __init__(self, api_key: Optional[str] = None, model_name: str = "meta-llama/llama-3-8b-instruct:free"):
@@ -17,6 +22,16 @@ class LLMJudgeService:
             "HTTP-Referer": "http://localhost:8000",
             "X-Title": "Flux Search Agent"
         }
+        # Shared pool so repeated judge calls reuse warm TLS connections to OpenRouter
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+
+    async def aclose(self) -> None:
+        """Closes the pooled HTTP client."""
+        await self._client.aclose()
 
     async def _call_api(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         """Helper to call OpenRouter API with retries"""
@@ -33,51 +48,49 @@ class LLMJudgeService:
         retries = 2
         base_delay = 5
 
-        async with httpx.AsyncClient() as client:
-            for attempt in range(retries + 1):
-                try:
-                    response = await client.post(
-                        OPENROUTER_URL, 
-                        headers=self.headers, 
-                        json=payload, 
-                        timeout=30.0
-                    )
-                    
-                    if response.status_code == 200:
-                        content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "{}")
-                        try:
-                            # Clean up potential markdown code blocks
-                            if "```json" in content:
-                                content = content.split("```json")[1].split("```")[0].strip()
-                            elif "```" in content:
-                                content = content.split("```")[1].split("```")[0].strip()
-                                
-                            result = json.loads(content)
-                            return result
-                        except json.JSONDecodeError:
-                            logger.error("JSON Decode Error in LLM result: %s", content)
-                            return {"score": 0.0, "reasoning": "Parse Error"}
-                    
-                    elif response.status_code == 429:
-                        wait_time = base_delay * (attempt + 1)
-                        logger.warning("OpenRouter 429 Rate Limit. Retrying in %ss...", wait_time)
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        logger.error("OpenRouter Error %s: %s", response.status_code, response.text)
-                        return {"score": 0.0, "reasoning": f"API Error {response.status_code}"}
-                        
-                except Exception as e:
-                    logger.error("Request Error in LLMJudgeService: %s", e)
-                    if attempt < retries:
-                        await asyncio.sleep(base_delay)
-                        continue
-                    return {"score": 0.0, "reasoning": str(e)}
-        
+        for attempt in range(retries + 1):
+            try:
+                response = await self._client.post(
+                    OPENROUTER_URL,
+                    headers=self.headers,
+                    json=payload
+                )
+
+                if response.status_code == 200:
+                    content = response.json().get("choices", [{}])[0].get("message", {}).get("content", "{}")
+                    try:
+                        # Clean up potential markdown code blocks
+                        fence = _FENCE.search(content)
+                        if fence:
+                            content = fence.group(1).strip()
+
+                        result = orjson.loads(content)
+                        return result
+                    except orjson.JSONDecodeError:
+                        logger.error("JSON Decode Error in LLM result: %s", content)
+                        return {"score": 0.0, "reasoning": "Parse Error"}
+
+                elif response.status_code == 429:
+                    wait_time = base_delay * (attempt + 1)
+                    logger.warning("OpenRouter 429 Rate Limit. Retrying in %ss...", wait_time)
+                    await asyncio.sleep(wait_time)
+                    continue
+                else:
+                    logger.error("OpenRouter Error %s: %s", response.status_code, response.text)
+                    return {"score": 0.0, "reasoning": f"API Error {response.status_code}"}
+
+            except Exception as e:
+                logger.error("Request Error in LLMJudgeService: %s", e)
+                if attempt < retries:
+                    await asyncio.sleep(base_delay)
+                    continue
+                return {"score": 0.0, "reasoning": str(e)}
+
         return {"score": 0.0, "reasoning": "Max retries exceeded"}
 
     async def evaluate_relevance(self, query: str, snippets: List[str]) -> Dict[str, Any]:
         """Evaluates the relevance of snippets to the query."""
+        snippets = [s[:MAX_SNIPPET_CHARS] for s in snippets]
         system_prompt = "You are a helpful assistant that evaluates search relevance. Output ONLY valid JSON."
         user_prompt = f"""
         Task: Rate the semantic RELEVANCE of the search results to the User Query.
@@ -85,7 +98,7 @@ class LLMJudgeService:
         User Query: "{query}"
         
         Results:
-        {json.dumps(snippets, indent=2)}
+        {orjson.dumps(snippets, option=orjson.OPT_INDENT_2).decode()}
         
         Instructions:
         1. Rate from 0.0 (Irrelevant) to 1.0 (Highly Relevant).
@@ -101,11 +114,7 @@ class LLMJudgeService:
 
     async def evaluate_credibility(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Evaluates the credibility of the sources."""
-        sources_text = []
-        for i, res in enumerate(results):
-            sources_text.append(f"Source {i+1}:\nURL: {res.get('url', res.get('link', 'N/A'))}\nSnippet: {res.get('snippet', 'N/A')}\n")
-        
-        sources_str = "\n".join(sources_text)
+        sources_str = self._format_sources(results)
         system_prompt = "You are an expert information quality judge. Output ONLY valid JSON."
         user_prompt = f"""
         Task: Evaluate the CREDIBILITY of these sources for the query.
@@ -128,4 +137,47 @@ class LLMJudgeService:
         ]
         return await self._call_api(messages)
 
+    async def evaluate_both(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Evaluates relevance and credibility of the sources in a single request."""
+        sources_str = self._format_sources(results)
+        system_prompt = "You are an expert search relevance and information quality judge. Output ONLY valid JSON."
+        user_prompt = f"""
+        Task: Evaluate the search results for the User Query on two axes:
+        RELEVANCE (do the snippets answer the query?) and CREDIBILITY (how trustworthy are the sources?).
+
+        User Query: "{query}"
+
+        Sources:
+        {sources_str}
+
+        Instructions:
+        1. Rate relevance from 0.0 (Irrelevant) to 1.0 (Highly Relevant).
+        2. Rate credibility from 0.0 (Low trust) to 1.0 (High trust/Academic/Government), using URLs (domain authority) and content.
+        3. Provide a 1-sentence reasoning for each.
+        4. Output JSON: {{ "relevance": {{ "score": <float>, "reasoning": "<string>" }}, "credibility": {{ "score": <float>, "reasoning": "<string>" }} }}
+        """
+
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        result = await self._call_api(messages)
+
+        # Error results from _call_api are flat {score, reasoning}; apply them to both axes
+        fallback = {"score": result.get("score", 0.0), "reasoning": result.get("reasoning", "No reasoning provided.")}
+        relevance = result.get("relevance")
+        credibility = result.get("credibility")
+        return {
+            "relevance": relevance if isinstance(relevance, dict) else fallback,
+            "credibility": credibility if isinstance(credibility, dict) else fallback
+        }
+
+    @staticmethod
+    def _format_sources(results: List[Dict[str, Any]]) -> str:
+        return "\n".join(
+            f"Source {i+1}:\nURL: {res.get('url') or res.get('link', 'N/A')}\n"
+            f"Snippet: {(res.get('snippet') or 'N/A')[:MAX_SNIPPET_CHARS]}\n"
+            for i, res in enumerate(results)
+        )
+
 llm_judge = LLMJudgeService()
@@ -1,7 +1,7 @@
 import os
 import hashlib
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import redis
 from app.utils.logger import logger
 
@@ -10,11 +10,14 @@ class CacheService:
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
         try:
             self.client: Optional[redis.Redis] = redis.from_url(self.redis_url, decode_responses=True)
+            # Separate client for raw byte payloads (e.g. packed embedding vectors)
+            self.binary_client: Optional[redis.Redis] = redis.from_url(self.redis_url)
             self.ttl = 6 * 60 * 60
             logger.info("Connected to Redis at %s", self.redis_url)
         except Exception as e:
             logger.error("Failed to connect to Redis: %s", e)
             self.client = None
+            self.binary_client = None
 
     def _generate_key(self, query: str, region: Optional[str] = None, language: Optional[str] = None, limit: Optional[int] = 10) -> str:
         key_content = f"{query}:{region}:{language}:{limit}"
@@ -48,4 +51,43 @@ class CacheService:
         except Exception as e:
             logger.error("Cache set error: %s", e)
 
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Fetches raw byte values for several keys in one round-trip."""
+        if not self.binary_client or not keys:
+            return [None] * len(keys)
+
+        try:
+            values = self.binary_client.mget(keys)
+            return list(values)
+        except Exception as e:
+            logger.error("Cache mget error: %s", e)
+            return [None] * len(keys)
+
+    def set_many(self, items: Dict[str, bytes], ttl: int):
+        """Stores raw byte values with a shared TTL in one pipelined round-trip."""
+        if not self.binary_client or not items:
+            return
+
+        try:
+            pipe = self.binary_client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.setex(key, ttl, value)
+            pipe.execute()
+        except Exception as e:
+            logger.error("Cache mset error: %s", e)
+
+    def publish(self, channel: str, message: str):
+        """Publishes a notification; failures are logged, never raised."""
+        if not self.client:
+            return
+
+        try:
+            self.client.publish(channel, message)
+        except Exception as e:
+            logger.error("Cache publish error: %s", e)
+
+def task_channel(task_id: str) -> str:
+    """Pub/sub channel announcing that a task's result has been stored."""
+    return f"task:{task_id}"
+
 cache = CacheService()
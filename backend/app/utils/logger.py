@@ -1,13 +1,26 @@
 import logging
 import sys
 import os
-import json
-from datetime import datetime
+import time
+import orjson
 
 class JsonFormatter(logging.Formatter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = -1
+        self._last_prefix = ""
+
+    def _timestamp(self, created: float) -> str:
+        # Records arrive many-per-second; only re-run strftime when the second changes
+        second = int(created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return f"{self._last_prefix}.{int((created - second) * 1_000_000):06d}"
+
     def format(self, record):
         log_record = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": self._timestamp(record.created),
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
@@ -15,7 +28,7 @@ class JsonFormatter(logging.Formatter):
         }
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        return orjson.dumps(log_record).decode()
 
 def setup_logger():
     log_level = os.getenv("LOG_LEVEL", "INFO").upper()
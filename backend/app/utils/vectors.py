@@ -0,0 +1,35 @@
+import base64
+from typing import List, Sequence, Tuple
+import numpy as np
+
+def pack_f16(vector: Sequence[float]) -> str:
+    """Encodes a vector as base64 of its little-endian float16 bytes."""
+    return base64.b64encode(np.asarray(vector, dtype="<f2").tobytes()).decode("ascii")
+
+# Decimals kept when float16 values become JSON floats: enough to round-trip every
+# float16 above 2**-6 in magnitude, and within 5e-6 of the rest
+F16_DECIMALS = 5
+
+def unpack_f16(data: str) -> List[float]:
+    """Decodes a vector produced by pack_f16.
+
+    Values are rounded to F16_DECIMALS so they serialize as short JSON numbers
+    rather than the full repr of the widened float16.
+    """
+    vector = np.frombuffer(base64.b64decode(data), dtype="<f2").astype(np.float64)
+    return list(np.round(vector, F16_DECIMALS).tolist())
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[List[str], float, float]:
+    """Scalar-quantizes rows to int8 with one scale and zero point for the batch.
+
+    Returns base64 int8 bytes per row; values decode as (q + 128) * scale + zero_point.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    low, high = float(vectors.min()), float(vectors.max())
+    scale = (high - low) / 255 or 1.0
+    quantized = np.round((vectors - low) / scale - 128).astype(np.int8)
+    return [base64.b64encode(row.tobytes()).decode("ascii") for row in quantized], scale, low
+
+def pack_binary(vector: Sequence[float]) -> str:
+    """Encodes a vector as base64 of its sign bits (1 for positive), 8 dimensions per byte."""
+    return base64.b64encode(np.packbits(np.asarray(vector) > 0).tobytes()).decode("ascii")
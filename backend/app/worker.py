@@ -1,18 +1,23 @@
 import asyncio
 import os
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
 from celery import Celery
 from celery.app.task import Task
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown
+from kombu.serialization import register
 from app.services.scraper import scraper
 from app.services.parser import parser
 from app.services.formatter import formatter
 from app.services.embeddings import embeddings_service
-from app.utils.cache import cache
+from app.utils.cache import cache, task_channel
+from app.utils.vectors import pack_f16
 from app.db.database import AsyncSessionLocal, init_db
 from app.db.repository import save_search_results
 from app.services.llm_judge import llm_judge
 from app.utils.logger import logger
 import httpx
+import orjson
 from prometheus_client import Counter
 
 TOKEN_USAGE = Counter(
@@ -35,6 +40,16 @@ DATABASE_URL = f"db+postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_H
 # Fallback to Redis for Broker only
 REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# Chain hand-offs carry the whole organic_results payload, so encode task
+# messages with orjson rather than stdlib json
+register(
+    "orjson",
+    lambda obj: orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8"
+)
+
 celery_app: Celery = Celery(
     "flux_worker",
     broker=REDIS_URL,
@@ -42,9 +57,9 @@ celery_app: Celery = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="orjson",
+    accept_content=["orjson", "json"],
+    result_serializer="orjson",
     timezone="UTC",
     enable_utc=True,
     # SQLAlchemy Result Backend Settings
@@ -60,6 +75,118 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True, # Re-queue task if worker crashes
 )
 
+# Set on the embeddings worker so each process loads the model at boot rather
+# than inside its first embed_task
+PRELOAD_EMBEDDINGS = os.getenv("PRELOAD_EMBEDDINGS", "false").lower() == "true"
+
+# Deep-scraped pages are parsed on threads: trafilatura/lxml do most of the
+# work in C, and prefork workers are daemonic so they cannot own a process pool.
+_PARSE_POOL = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+
+# One event loop per worker process, shared by every task it runs so pooled
+# clients (httpx, asyncpg) keep their connections across tasks.
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Returns this process's event loop, creating it on first use."""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    return _worker_loop
+
+# Set once the schema check has succeeded in this process
+_db_ready = False
+
+async def ensure_db() -> None:
+    """Runs init_db once per process; a failed attempt is retried by the next caller."""
+    global _db_ready
+    if not _db_ready:
+        await init_db()
+        _db_ready = True
+
+@worker_process_init.connect
+def init_worker_process(**kwargs: Any) -> None:
+    """Creates the worker loop, ensures the database schema exists and warms the embedding model."""
+    loop = get_worker_loop()
+    try:
+        loop.run_until_complete(ensure_db())
+    except Exception as e:
+        logger.error("Database init error: %s", e)
+
+    if PRELOAD_EMBEDDINGS:
+        try:
+            embeddings_service.warmup()
+        except Exception as e:
+            logger.error("Embedding warmup error: %s", e)
+
+@worker_process_shutdown.connect
+def close_http_clients(**kwargs: Any) -> None:
+    """Closes pooled HTTP clients when a worker process exits."""
+    try:
+        get_worker_loop().run_until_complete(llm_judge.aclose())
+    except Exception as e:
+        logger.error("Failed to close LLM judge client: %s", e)
+
+async def _fetch_and_format(
+    query: str,
+    region: str,
+    language: str,
+    limit: int,
+    mode: str
+) -> Dict[str, Any]:
+    """Fetches and parses the query, then deep-scrapes the top results."""
+    if mode == "scrape":
+        content = await scraper.scrape_url(query)
+        if not content:
+            # Raise exception to trigger retry
+            raise httpx.RequestError(f"Failed to scrape URL: {query}")
+
+        parsed_data = parser.parse_url_content(content)
+        if parsed_data["organic_results"] and not parsed_data["organic_results"][0]["url"]:
+            parsed_data["organic_results"][0]["url"] = query
+    else:
+        content = await scraper.fetch_results(query, region, language, limit)
+        if not content:
+            # Raise exception to trigger retry
+            raise httpx.RequestError(f"Failed to fetch search results for query: {query}")
+        parsed_data = parser.parse(content)
+
+    formatted_data = formatter.format_response(query, parsed_data)
+
+    # Phase 1.5: Deep Scrape Enrichment (Parallel)
+    results = formatted_data.get("organic_results")
+    if mode != "scrape" and results:
+        logger.info("Enriching organic results with deep scraping...")
+        # Limit URLs to avoid massive parallel overhead if user requested 50
+        targets = [res for res in results if res.get("url")][:10]
+
+        if targets:
+            try:
+                raw_contents = await scraper.scrape_multiple_urls([res["url"] for res in targets])
+                pages = [(res, raw) for res, raw in zip(targets, raw_contents) if raw]
+
+                # Parse and filter full content using trafilatura logic
+                loop = asyncio.get_running_loop()
+                parsed_pages = await asyncio.gather(*(
+                    loop.run_in_executor(_PARSE_POOL, parser.parse_url_content, raw)
+                    for _, raw in pages
+                ))
+
+                for (res, _), parsed_page in zip(pages, parsed_pages):
+                    enriched = parsed_page["organic_results"]
+                    text = enriched[0].get("snippet", "") if enriched else ""
+                    if not text:
+                        continue
+                    res["full_content"] = text
+                    # Also update snippet if snippet was too short before
+                    if len(text) > len(res.get("snippet", "")):
+                        res["snippet"] = text[:300] + "..."
+            except Exception as e:
+                logger.error("Deep scrape enrichment failed: %s", e)
+
+    return formatted_data
+
 @celery_app.task(
     bind=True,
     name="app.worker.scrape_task",
@@ -89,58 +216,12 @@ def scrape_task(
         logger.info("Cache hit!")
         return cached_data
 
-    logger.info("Cache miss. Setting up event loop.")
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-    content = None
-    parsed_data = None
-
-    if mode == "scrape":
-        content = loop.run_until_complete(scraper.scrape_url(query))
-        if not content:
-            # Raise exception to trigger retry
-            raise httpx.RequestError(f"Failed to scrape URL: {query}")
-        
-        parsed_data = parser.parse_url_content(content)
-        if parsed_data["organic_results"] and not parsed_data["organic_results"][0]["url"]:
-            parsed_data["organic_results"][0]["url"] = query
-    else:
-        content = loop.run_until_complete(scraper.fetch_results(query, region, language, limit))
-        if not content:
-            # Raise exception to trigger retry
-            raise httpx.RequestError(f"Failed to fetch search results for query: {query}")
-        parsed_data = parser.parse(content)
-
-    formatted_data = formatter.format_response(query, parsed_data)
-
-    # Phase 1.5: Deep Scrape Enrichment (Parallel)
-    if mode != "scrape" and formatted_data.get("organic_results"):
-        logger.info("Enriching organic results with deep scraping...")
-        urls = [res.get("url") for res in formatted_data["organic_results"] if res.get("url")]
-        
-        if urls:
-            try:
-                # Limit URLs to avoid massive parallel overhead if user requested 50
-                urls_to_scrape = urls[:10] 
-                raw_contents = loop.run_until_complete(scraper.scrape_multiple_urls(urls_to_scrape))
-                
-                for i, raw in enumerate(raw_contents):
-                    if raw:
-                        # Parse and filter full content using trafilatura logic
-                        enriched = parser.parse_url_content(raw)
-                        # Store in the result
-                        if enriched["organic_results"]:
-                            text = enriched["organic_results"][0].get("snippet", "")
-                            formatted_data["organic_results"][i]["full_content"] = text
-                            # Also update snippet if snippet was too short before
-                            if len(text) > len(formatted_data["organic_results"][i].get("snippet", "")):
-                                formatted_data["organic_results"][i]["snippet"] = text[:300] + "..."
-            except Exception as e:
-                logger.error("Deep scrape enrichment failed: %s", e)
+    logger.info("Cache miss. Fetching fresh results.")
+    # Fetch, parse and enrich inside one coroutine so the task enters the
+    # worker loop once instead of once per network call.
+    formatted_data = get_worker_loop().run_until_complete(
+        _fetch_and_format(query, region, language, limit, mode)
+    )
 
     result = {
         "query": query,
@@ -152,6 +233,9 @@ def scrape_task(
 
     return result
 
+# Per-request markers telling the API how to render embeddings for one output_format
+EMBEDDING_OUTPUT_FLAGS = ("expand_embeddings", "embedding_precision")
+
 @celery_app.task(bind=True, name="app.worker.embed_task", queue="embeddings")
 def embed_task(
     self: Task,
@@ -169,33 +253,43 @@ def embed_task(
     if "error" in result:
             return result
 
+    # A cache hit replays an earlier request's result; drop that request's
+    # vectors and output flags so only this request's output_format applies
+    for flag in EMBEDDING_OUTPUT_FLAGS:
+        result.pop(flag, None)
+    for res in result.get("organic_results", []):
+        res.pop("embedding_b16", None)
+        res.pop("embedding", None)
+
     query = result.get("query", "")
     token_estimate = result.get("token_estimate", 0)
     TOKEN_USAGE.labels(model="unknown", context="embedding_input").inc(token_estimate)
     
     # Generate Embeddings (CPU Intensive)
-
-    # Generate Embeddings (CPU Intensive)
-    if output_format and output_format.lower() in ["vector", "vectors"]:
-        snippets = [res.get("snippet", "") for res in result.get("organic_results", [])]
-        if snippets:
+    fmt = (output_format or "").lower()
+    if fmt in ["vector", "vectors", "vector_b16", "vector_int8", "vector_binary"]:
+        # Results without snippet text have nothing to embed
+        embeddable = [res for res in result.get("organic_results", []) if (res.get("snippet") or "").strip()]
+        if embeddable:
             # This is the blocking CPU part
-            vectors = embeddings_service.generate(snippets)
-            for i, res in enumerate(result["organic_results"]):
-                if i < len(vectors):
-                    res["embedding"] = vectors[i]
+            vectors = embeddings_service.generate_array([res["snippet"] for res in embeddable])
+            if vectors is not None:
+                # Vectors travel through the broker, result backend and cache as
+                # base64 float16; the API expands them for "vector" requests and
+                # quantizes them for "vector_int8" / "vector_binary".
+                for res, vec in zip(embeddable, vectors):
+                    res["embedding_b16"] = pack_f16(vec)
+                if fmt in ("vector_int8", "vector_binary"):
+                    result["embedding_precision"] = fmt.split("_", 1)[1]
+                else:
+                    result["expand_embeddings"] = fmt != "vector_b16"
 
     # Save to Database (I/O)
     try:
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(init_db())
+        loop = get_worker_loop()
 
         async def _save():
+            await ensure_db()
             async with AsyncSessionLocal() as session:
                 await save_search_results(session, query, result["organic_results"])
 
@@ -203,9 +297,9 @@ def embed_task(
     except Exception as e:
         logger.error("Database save error: %s", e)
 
-    # Update Cache
+    # Update Cache (without this request's output flags)
     if result.get("organic_results"):
-        cache.set(query, result, region, language, limit)
+        cache.set(query, {k: v for k, v in result.items() if k not in EMBEDDING_OUTPUT_FLAGS}, region, language, limit)
 
     return result
 
@@ -223,23 +317,15 @@ def score_task(
 
     query = result.get("query", "")
     organic_results = result.get("organic_results", [])
-    snippets = [r.get("snippet", "") for r in organic_results]
 
-    try:
-        loop = asyncio.get_event_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-    # Run scoring in parallel
-    async def _score():
-        rel_task = llm_judge.evaluate_relevance(query, snippets)
-        cred_task = llm_judge.evaluate_credibility(query, organic_results)
-        return await asyncio.gather(rel_task, cred_task)
+    loop = get_worker_loop()
 
+    # Relevance and credibility share one prompt and one round-trip
     try:
-        rel_out, cred_out = loop.run_until_complete(_score())
-        
+        scores = loop.run_until_complete(llm_judge.evaluate_both(query, organic_results))
+        rel_out = scores["relevance"]
+        cred_out = scores["credibility"]
+
         result["relevance_score"] = rel_out.get("score", 0.0)
         result["relevance_reasoning"] = rel_out.get("reasoning", "No reasoning provided.")
         result["credibility_score"] = cred_out.get("score", 0.0)
@@ -254,6 +340,13 @@ def score_task(
 
     return result
 
+@task_postrun.connect
+def notify_task_done(sender: Optional[Task] = None, task_id: Optional[str] = None, **kwargs: Any) -> None:
+    """Wakes /tasks/{id}/stream listeners once the chain's final result is stored."""
+    # task_postrun fires after the result backend write, so listeners can read it straight away
+    if task_id and sender is not None and sender.name == score_task.name:
+        cache.publish(task_channel(task_id), "done")
+
 @celery_app.task(name="app.worker.health_check")
 def health_check():
     return "OK"
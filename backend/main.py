@@ -3,9 +3,10 @@ from typing import Any, Dict
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from dotenv import load_dotenv
 from fastapi_limiter import FastAPILimiter
+import httpx
 import redis.asyncio as redis
 from app.api.routes import router
 from app.utils.logger import logger
@@ -21,9 +22,14 @@ async def lifespan(app: FastAPI):
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     r = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(r)
+    # One pooled client for outbound HTTP from request handlers (see get_http_client)
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    )
     logger.info("Application starting up...")
     yield
     # Shutdown
+    await app.state.http_client.aclose()
     await r.close()
     logger.info("Application shutting down...")
 
@@ -31,18 +37,30 @@ app: FastAPI = FastAPI(
     title="Agent-First SERP Gateway",
     description="A resilient, token-optimized Search-to-LLM context API.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 from prometheus_fastapi_instrumentator import Instrumentator
 from prometheus_client import multiprocess, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
 from fastapi.responses import Response
 
+# The multiprocess registry is only rebuilt when worker processes add or
+# remove metric files, which bumps the directory mtime.
+_REGISTRY_CACHE: Dict[str, Any] = {"mtime": 0, "registry": None}
+
 def make_metrics_app():
     registry = CollectorRegistry()
     multiprocess.MultiProcessCollector(registry)
     return registry
 
+def get_metrics_registry():
+    mtime = os.stat(os.environ["PROMETHEUS_MULTIPROC_DIR"]).st_mtime_ns
+    if _REGISTRY_CACHE["registry"] is None or _REGISTRY_CACHE["mtime"] != mtime:
+        _REGISTRY_CACHE["registry"] = make_metrics_app()
+        _REGISTRY_CACHE["mtime"] = mtime
+    return _REGISTRY_CACHE["registry"]
+
 @app.on_event("startup")
 async def startup_event():
     # Clear multiprocess directory to remove zombie metrics
@@ -56,7 +74,7 @@ async def startup_event():
 
 @app.get("/metrics")
 async def metrics():
-    registry = make_metrics_app()
+    registry = get_metrics_registry()
     return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
 
 instrumentator = Instrumentator()
@@ -5,14 +5,21 @@ from app.worker import celery_app
 
 PROJECT_ROOT = Path(__file__).parent.parent
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(autouse=True, scope="session")
 def setup_celery_test_mode():
+    # Run tasks in-process once for the whole session; eager results stay in
+    # memory and never touch the broker or result backend.
     celery_app.conf.update(
         broker_url='memory://',
         result_backend='cache+memory://',
+        cache_backend='memory',
         task_always_eager=True,
-        task_eager_propagates=True
+        task_eager_propagates=True,
+        task_store_eager_result=False
     )
+    # Finalize the app once, up front, so the task registry is bound before
+    # the first test instead of lazily inside whichever test touches it first
+    celery_app.finalize(auto=True)
 
 @pytest.fixture
 def mock_html_content():
@@ -82,6 +82,45 @@ class TestCacheServiceGaps:
         cache.set("query", {"data": "value"})
 
 
+    @patch("app.utils.cache.redis.from_url")
+    def test_cache_get_many_and_set_many(self, mock_redis):
+        """Test raw byte batch operations"""
+        mock_client = MagicMock()
+        mock_redis.return_value = mock_client
+        mock_client.mget.return_value = [b"vec", None]
+
+        cache = CacheService()
+
+        assert cache.get_many(["a", "b"]) == [b"vec", None]
+        cache.set_many({"a": b"vec"}, 60)
+        mock_client.pipeline.return_value.setex.assert_called_with("a", 60, b"vec")
+
+    @patch("app.utils.cache.redis.from_url")
+    def test_cache_publish(self, mock_redis):
+        """Test task notifications go out on the task channel and swallow errors"""
+        from app.utils.cache import task_channel
+        mock_client = MagicMock()
+        mock_redis.return_value = mock_client
+
+        cache = CacheService()
+        cache.publish(task_channel("abc"), "done")
+        mock_client.publish.assert_called_once_with("task:abc", "done")
+
+        mock_client.publish.side_effect = Exception("Redis error")
+        cache.publish(task_channel("abc"), "done")
+
+    @patch("app.utils.cache.redis.from_url")
+    def test_cache_get_many_with_error(self, mock_redis):
+        """Test batch get degrades to all misses on error"""
+        mock_client = MagicMock()
+        mock_redis.return_value = mock_client
+        mock_client.mget.side_effect = Exception("Redis error")
+
+        cache = CacheService()
+
+        assert cache.get_many(["a", "b"]) == [None, None]
+
+
 class TestEmbeddingsModelLoadingGaps:
     """Fill embeddings.py model loading gaps"""
 
@@ -105,33 +144,18 @@ class TestEmbeddingsModelLoadingGaps:
 class TestWorkerEventLoopGaps:
     """Fill worker.py event loop handling gaps"""
 
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.cache")
-    @patch("app.worker.asyncio.get_event_loop")
-    def test_worker_new_event_loop_creation(
-        self, mock_get_loop, mock_cache, mock_embeddings,
-        mock_formatter, mock_parser, mock_scraper
-    ):
-        """Test worker creates new event loop on RuntimeError"""
-        from app.worker import scrape_task
-
-        mock_get_loop.side_effect = RuntimeError("No running event loop")
-
-        mock_cache.get.return_value = None
-        mock_scraper.fetch_results = AsyncMock(return_value=[{"title": "Result"}])
-        mock_parser.parse.return_value = {"ai_overview": None, "organic_results": []}
-        mock_formatter.format_response.return_value = {
-            "query": "test", "ai_overview": None, "organic_results": [],
-            "formatted_output": "F", "token_estimate": 1
-        }
-        mock_embeddings.generate.return_value = []
+    def test_worker_loop_recreated_when_closed(self):
+        """Test worker replaces its event loop if it has been closed"""
+        from app.worker import get_worker_loop
 
-        result = scrape_task.apply(args=["test", "us", "en", 10, "search"]).get()
+        loop = get_worker_loop()
+        assert get_worker_loop() is loop
 
-        assert result is not None
+        loop.close()
+        new_loop = get_worker_loop()
+
+        assert new_loop is not loop
+        assert not new_loop.is_closed()
 
 
 class TestFormatterEdgeCases:
@@ -7,42 +7,46 @@ from app.services.parser import parser
 
 class TestCoverageImprovements:
 
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.cache")
-    @patch("asyncio.get_event_loop")
-    def test_worker_loop_creation_runtime_error(
-        self, mock_get_loop, mock_cache, mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
-        """Test that worker creates a new loop if get_event_loop raises RuntimeError"""
-        mock_get_loop.side_effect = RuntimeError("No event loop")
-        mock_cache.get.return_value = None
+    @patch("app.worker._db_ready", False)
+    @patch("app.worker.init_db")
+    @patch("app.worker.logger")
+    def test_worker_process_init_db_error(self, mock_logger, mock_init):
+        """Test that worker_process_init logs and swallows DB init errors"""
+        from app.worker import init_worker_process
+
+        mock_init.side_effect = Exception("DB init error")
 
-        # We need to mock asyncio.new_event_loop and set_event_loop to avoid actually messing with the test runner's loop
-        with patch("asyncio.new_event_loop") as mock_new_loop, \
-             patch("asyncio.set_event_loop") as mock_set_loop:
+        init_worker_process()
 
-            mock_loop_instance = MagicMock()
-            mock_new_loop.return_value = mock_loop_instance
+        mock_logger.error.assert_called()
+        assert "Database init error" in str(mock_logger.error.call_args)
 
-            # Mock the run_until_complete to return something so the task proceeds
-            mock_loop_instance.run_until_complete.return_value = [{"title": "test"}]
+    @patch("app.worker._db_ready", False)
+    @patch("app.worker.init_db", new_callable=AsyncMock)
+    def test_ensure_db_runs_init_once(self, mock_init):
+        """Test that the schema check only runs until it first succeeds"""
+        from app.worker import ensure_db, get_worker_loop
 
-            # Fix: mock parser to return valid structure to avoid downstream errors
-            mock_parser.parse.return_value = {"ai_overview": None, "organic_results": []}
-            mock_formatter.format_response.return_value = {
-                "query": "test", "ai_overview": None, "organic_results": [], "formatted_output": "", "token_estimate": 0
-            }
+        loop = get_worker_loop()
+        mock_init.side_effect = [Exception("DB down"), None]
 
-            try:
-                scrape_task.apply(args=["test", "us", "en", 10, "search"]).get()
-            except Exception:
-                pass # We just want to verify loop creation logic
+        with pytest.raises(Exception):
+            loop.run_until_complete(ensure_db())
+        loop.run_until_complete(ensure_db())
+        loop.run_until_complete(ensure_db())
 
-            mock_new_loop.assert_called_once()
-            mock_set_loop.assert_called_with(mock_loop_instance)
+        assert mock_init.await_count == 2
+
+    @patch("app.worker.PRELOAD_EMBEDDINGS", True)
+    @patch("app.worker.embeddings_service")
+    @patch("app.worker.init_db", new_callable=AsyncMock)
+    def test_worker_process_init_preloads_embeddings(self, mock_init, mock_embeddings):
+        """Test that worker_process_init warms the embedding model when enabled"""
+        from app.worker import init_worker_process
+
+        init_worker_process()
+
+        mock_embeddings.warmup.assert_called_once()
 
     @patch("app.worker.embeddings_service")
     @patch("app.worker.init_db")
@@ -61,10 +65,6 @@ class TestCoverageImprovements:
         # Mock successful embedding generation
         mock_embeddings.generate.return_value = [[0.1, 0.2]]
 
-        # Mock init_db to succeed
-        mock_init_db_coro = AsyncMock()
-        mock_init.return_value = mock_init_db_coro
-
         # Mock save_search_results to raise exception
         mock_save.side_effect = Exception("DB Save Failed")
 
@@ -75,14 +75,15 @@ class TestCoverageImprovements:
         # Note: In the actual task, it creates a local async function `_save` and runs it.
         # We can simulate the exception bubbling up from `loop.run_until_complete`
 
-        with patch("asyncio.get_event_loop") as mock_get_loop:
+        with patch("app.worker.get_worker_loop") as mock_get_loop:
              mock_loop = MagicMock()
              mock_get_loop.return_value = mock_loop
-             # First call is init_db, second is _save
-             # We make the second call raise the exception
-             mock_loop.run_until_complete.side_effect = [None, Exception("DB Save Failed")]
+             def _fail(coro):
+                 coro.close()
+                 raise Exception("DB Save Failed")
+             mock_loop.run_until_complete.side_effect = _fail
 
-             res = embed_task.apply(args=[result_input, "us", "en", 10, "vector"]).get()
+             res = embed_task.apply(args=[result_input, "us", "en", 10, "vector"]).result
 
              assert res is not None
              # Verify logger error was called
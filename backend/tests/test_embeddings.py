@@ -4,6 +4,14 @@ from app.services.embeddings import EmbeddingsService
 import numpy as np
 
 
+@pytest.fixture(autouse=True)
+def mock_vector_cache():
+    """Keep embedding tests independent of a live Redis"""
+    with patch("app.services.embeddings.cache") as mock_cache:
+        mock_cache.get_many.side_effect = lambda keys: [None] * len(keys)
+        yield mock_cache
+
+
 class TestEmbeddingsService:
     """Test EmbeddingsService for vector generation"""
 
@@ -187,4 +195,222 @@ class TestEmbeddingsService:
 
         assert result is not None
 
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_generate_restores_input_order(self, mock_transformer):
+        """Test that length-sorted batching returns vectors in input order"""
+        mock_model = MagicMock()
+        mock_transformer.return_value = mock_model
+        mock_model.encode.side_effect = lambda texts, **kwargs: np.array([[float(len(t))] for t in texts])
+
+        service = EmbeddingsService()
+        result = service.generate(["long text here", "a", "mid text"])
+
+        assert result == [[14.0], [1.0], [8.0]]
+        sorted_texts = mock_model.encode.call_args[0][0]
+        assert sorted_texts == ["a", "mid text", "long text here"]
+        assert mock_model.encode.call_args[1]["batch_size"] == 64
+
+    def test_generate_empty_input(self):
+        """Test that an empty input list skips encoding"""
+        service = EmbeddingsService()
+        service.model = MagicMock()
+
+        assert service.generate([]) == []
+        service.model.encode.assert_not_called()
+
+    def test_generate_uses_local_cache(self):
+        """Test that repeated snippets are served without re-encoding"""
+        service = EmbeddingsService()
+        service.model = MagicMock()
+        service.model.encode.side_effect = lambda texts, **kwargs: np.array([[0.5, 0.5] for _ in texts])
+
+        first = service.generate(["cached snippet"])
+        second = service.generate(["cached snippet"])
+
+        assert first == second == [[0.5, 0.5]]
+        assert service.model.encode.call_count == 1
+
+    def test_generate_uses_redis_cache(self, mock_vector_cache):
+        """Test that Redis hits are decoded and only misses are encoded"""
+        service = EmbeddingsService()
+        service.model = MagicMock()
+        service.model.encode.side_effect = lambda texts, **kwargs: np.array([[0.0, 1.0] for _ in texts])
+        cached = np.array([1.0, 0.0], dtype=np.float16).tobytes()
+        mock_vector_cache.get_many.side_effect = lambda keys: [cached, None]
+
+        result = service.generate(["hit", "miss"])
+
+        assert result == [[1.0, 0.0], [0.0, 1.0]]
+        assert service.model.encode.call_args[0][0] == ["miss"]
+        stored = mock_vector_cache.set_many.call_args[0][0]
+        assert list(stored.values()) == [np.array([0.0, 1.0], dtype=np.float16).tobytes()]
+
+    def test_generate_encodes_duplicates_once(self):
+        """Test that duplicate snippets in one call are encoded once"""
+        service = EmbeddingsService()
+        service.model = MagicMock()
+        service.model.encode.side_effect = lambda texts, **kwargs: np.array([[0.3] for _ in texts])
+
+        result = service.generate(["same", "same", "other"])
+
+        assert len(result) == 3
+        assert sorted(service.model.encode.call_args[0][0]) == ["other", "same"]
+
+    def test_generate_array_is_float16(self):
+        """Test that vectors are narrowed to float16"""
+        service = EmbeddingsService()
+        service.model = MagicMock()
+        service.model.encode.side_effect = lambda texts, **kwargs: np.array([[0.1, 0.2] for _ in texts])
+
+        vectors = service.generate_array(["text"])
+
+        assert vectors.dtype == np.float16
+        assert vectors.shape == (1, 2)
+
+    @patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "none")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_prefers_onnx_backend(self, mock_transformer):
+        """Test that the ONNX backend is requested first"""
+        service = EmbeddingsService()
+        service._load_model()
+
+        assert mock_transformer.call_args_list[0][1]["backend"] == "onnx"
+        assert service.model is mock_transformer.return_value
+
+    @patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "none")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_falls_back_to_torch(self, mock_transformer):
+        """Test fallback to the PyTorch model when ONNX is unavailable"""
+        torch_model = MagicMock()
+        mock_transformer.side_effect = [ImportError("optimum not installed"), torch_model]
+
+        service = EmbeddingsService()
+        service._load_model()
+
+        assert service.model is torch_model
+        assert mock_transformer.call_args_list[1] == ((service.model_name,), {})
+
+    @patch("app.services.embeddings.EMBEDDING_THREADS", 3)
+    @patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "none")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_caps_onnx_threads(self, mock_transformer):
+        """Test that ONNX sessions get the per-process thread budget"""
+        onnxruntime = MagicMock()
+        with patch.dict("sys.modules", {"onnxruntime": onnxruntime}):
+            EmbeddingsService()._load_model()
+
+        options = mock_transformer.call_args_list[0][1]["model_kwargs"]["session_options"]
+        assert options is onnxruntime.SessionOptions.return_value
+        assert options.intra_op_num_threads == 3
+
+    @patch("app.services.embeddings.EMBEDDING_BACKEND", "torch")
+    @patch("app.services.embeddings.EMBEDDING_THREADS", 3)
+    @patch("torch.set_num_threads")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_caps_torch_threads(self, mock_transformer, mock_set_threads):
+        """Test that the PyTorch fallback uses the same per-process thread budget"""
+        EmbeddingsService()._load_model()
+
+        mock_set_threads.assert_called_once_with(3)
+
+    @patch("app.services.embeddings.EMBEDDING_BACKEND", "torch")
+    @patch("torch.cuda.is_available", return_value=True)
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_uses_fp16_on_gpu(self, mock_transformer, mock_cuda):
+        """Test that the PyTorch model is cast to half precision when CUDA is available"""
+        service = EmbeddingsService()
+        service._load_model()
+
+        mock_transformer.return_value.half.assert_called_once()
+        assert service.model is mock_transformer.return_value.half.return_value
+        assert service.variant == "torch-fp16"
+
+    @patch("sentence_transformers.export_dynamic_quantized_onnx_model")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_load_model_exports_quantized_once(self, mock_transformer, mock_export, tmp_path):
+        """Test that the int8 model is staged, published atomically and reused afterwards"""
+        import os
+
+        model_dir = tmp_path / "all-MiniLM-L6-v2"
+        file_name = "onnx/model_int8_avx2.onnx"
+
+        def export(model, config, path, file_suffix):
+            # Nothing is visible at the final path while the export is running
+            assert not model_dir.exists()
+            os.makedirs(os.path.join(path, "onnx"))
+            with open(os.path.join(path, file_name), "w") as f:
+                f.write("graph")
+
+        mock_export.side_effect = export
+        with patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "avx2"), \
+             patch("app.services.embeddings.EMBEDDING_MODEL_DIR", str(tmp_path)):
+            service = EmbeddingsService()
+            service._load_model()
+
+            assert (model_dir / file_name).read_text() == "graph"
+            assert [p.name for p in tmp_path.iterdir()] == ["all-MiniLM-L6-v2"]
+            assert mock_transformer.call_args_list[-1] == (
+                (str(model_dir),), {"backend": "onnx", "model_kwargs": service._onnx_model_kwargs(file_name=file_name)}
+            )
+            assert service.variant == "onnx-int8_avx2"
+
+            mock_transformer.reset_mock()
+            EmbeddingsService()._load_model()
+
+            mock_export.assert_called_once()
+            mock_transformer.assert_called_once_with(
+                str(model_dir), backend="onnx", model_kwargs=service._onnx_model_kwargs(file_name=file_name)
+            )
+
+    @patch("sentence_transformers.export_dynamic_quantized_onnx_model")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_export_into_existing_model_dir_moves_graph_only(self, mock_transformer, mock_export, tmp_path):
+        """Test that a second quantization target is added next to an existing export"""
+        import os
+
+        model_dir = tmp_path / "all-MiniLM-L6-v2"
+        (model_dir / "onnx").mkdir(parents=True)
+        (model_dir / "onnx" / "model_int8_avx2.onnx").write_text("old")
+        (model_dir / "tokenizer.json").write_text("{}")
+        file_name = "onnx/model_int8_arm64.onnx"
+
+        def export(model, config, path, file_suffix):
+            os.makedirs(os.path.join(path, "onnx"))
+            with open(os.path.join(path, file_name), "w") as f:
+                f.write("graph")
+
+        mock_export.side_effect = export
+        with patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "arm64"), \
+             patch("app.services.embeddings.EMBEDDING_MODEL_DIR", str(tmp_path)):
+            EmbeddingsService()._load_model()
+
+        assert (model_dir / file_name).read_text() == "graph"
+        assert (model_dir / "onnx" / "model_int8_avx2.onnx").read_text() == "old"
+        assert [p.name for p in tmp_path.iterdir()] == ["all-MiniLM-L6-v2"]
+
+    def test_cache_key_depends_on_model_variant(self):
+        """Test that vectors from different runtimes/precisions do not share cache entries"""
+        service = EmbeddingsService()
+        service.variant = "onnx-int8_avx2"
+        int8_key = service._cache_key("text")
+        service.variant = "onnx"
+
+        assert service._cache_key("text") != int8_key
+
+    @patch("app.services.embeddings.EMBEDDING_QUANTIZATION", "none")
+    @patch("sentence_transformers.SentenceTransformer")
+    def test_warmup_loads_and_encodes(self, mock_transformer):
+        """Test that warmup loads the model and runs one encode"""
+        mock_transformer.return_value.encode.return_value = np.array([[0.1, 0.2]])
+
+        service = EmbeddingsService()
+
+        assert service.warmup() is True
+        mock_transformer.return_value.encode.assert_called_once()
+
+    def test_warmup_without_model(self):
+        """Test that warmup reports failure when the model is missing"""
+        service = EmbeddingsService()
+        service.model = False
 
+        assert service.warmup() is False
@@ -1,5 +1,6 @@
 import pytest
 from typing import Dict, Any
+from unittest.mock import patch
 from app.services.formatter import FormatterService
 
 
@@ -192,6 +193,12 @@ class TestFormatterService:
         assert "token_estimate" in result
         assert result["token_estimate"] > 0
 
+    def test_estimate_tokens_counts_words_not_separators(self, formatter):
+        """Test that blank lines, rules and trailing spaces add no words"""
+        text = "## Title \n\n---\n\nSome  words here\n\n"
+
+        assert formatter._estimate_tokens(text) == int(len(text.split()) * 1.3)
+
     def test_format_response_none_overview(self, formatter):
         """Test formatting with None ai_overview"""
         parsed_data: Dict[str, Any] = {
@@ -231,6 +238,21 @@ class TestFormatterService:
 
         assert len(result["organic_results"]) >= 1
 
+    def test_deduplicate_exact_repeats_without_vectorizing(self, formatter):
+        """Test that case/whitespace repeats are dropped and empty snippets kept"""
+        results = [
+            {"url": "https://a.com", "snippet": "Python is  great"},
+            {"url": "https://b.com", "snippet": "python is great"},
+            {"url": "https://c.com", "snippet": ""},
+            {"url": "https://d.com", "snippet": ""}
+        ]
+
+        with patch.object(formatter._vectorizer, "transform") as mock_transform:
+            unique = formatter._deduplicate_results(results)
+
+        assert [r["url"] for r in unique] == ["https://a.com", "https://c.com", "https://d.com"]
+        mock_transform.assert_not_called()
+
     def test_format_response_markdown_generation(self, formatter):
         """Test markdown output generation"""
         parsed_data: Dict[str, Any] = {
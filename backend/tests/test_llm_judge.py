@@ -0,0 +1,100 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from app.services.llm_judge import LLMJudgeService
+
+
+class TestLLMJudgeService:
+    """Test LLMJudgeService OpenRouter calls"""
+
+    @pytest.fixture
+    def judge(self):
+        """Create judge instance with a dummy API key"""
+        return LLMJudgeService(api_key="test-key")
+
+    def _mock_response(self, content: str, status_code: int = 200) -> MagicMock:
+        response = MagicMock()
+        response.status_code = status_code
+        response.json.return_value = {"choices": [{"message": {"content": content}}]}
+        return response
+
+    @pytest.mark.asyncio
+    async def test_missing_api_key(self):
+        """Test that no request is made without an API key"""
+        judge = LLMJudgeService(api_key=None)
+        judge.api_key = None
+        judge._client.post = AsyncMock()
+
+        result = await judge.evaluate_relevance("query", ["snippet"])
+
+        assert result["reasoning"] == "Missing API Key"
+        judge._client.post.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_client_reused_across_calls(self, judge):
+        """Test that consecutive calls share the pooled client"""
+        judge._client.post = AsyncMock(return_value=self._mock_response('{"score": 0.8, "reasoning": "ok"}'))
+
+        rel = await judge.evaluate_relevance("query", ["snippet"])
+        cred = await judge.evaluate_credibility("query", [{"url": "https://a.com", "snippet": "s"}])
+
+        assert rel["score"] == 0.8
+        assert cred["score"] == 0.8
+        assert judge._client.post.await_count == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("content", [
+        'Here you go:\n```json\n{"score": 0.6, "reasoning": "fenced"}\n```',
+        '```\n{"score": 0.6, "reasoning": "fenced"}\n```',
+        '```json {"score": 0.6, "reasoning": "fenced"}'
+    ])
+    async def test_strips_code_fences(self, judge, content):
+        """Test that JSON wrapped in markdown fences is still parsed"""
+        judge._client.post = AsyncMock(return_value=self._mock_response(content))
+
+        result = await judge.evaluate_relevance("query", ["snippet"])
+
+        assert result == {"score": 0.6, "reasoning": "fenced"}
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_client(self, judge):
+        """Test that aclose closes the pooled client"""
+        await judge.aclose()
+
+        assert judge._client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_evaluate_both_single_call(self, judge):
+        """Test that relevance and credibility come from one request"""
+        content = (
+            '{"relevance": {"score": 0.9, "reasoning": "on topic"},'
+            ' "credibility": {"score": 0.7, "reasoning": "reputable"}}'
+        )
+        judge._client.post = AsyncMock(return_value=self._mock_response(content))
+
+        result = await judge.evaluate_both("query", [{"url": "https://a.com", "snippet": "s"}])
+
+        assert result["relevance"]["score"] == 0.9
+        assert result["credibility"]["score"] == 0.7
+        assert judge._client.post.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_evaluate_both_error_fallback(self, judge):
+        """Test that an API error is reported on both axes"""
+        judge._client.post = AsyncMock(return_value=self._mock_response("", status_code=500))
+
+        result = await judge.evaluate_both("query", [])
+
+        assert result["relevance"] == {"score": 0.0, "reasoning": "API Error 500"}
+        assert result["credibility"] == {"score": 0.0, "reasoning": "API Error 500"}
+
+    def test_format_sources_truncates_snippets(self):
+        """Test that source snippets are capped before prompting"""
+        sources = LLMJudgeService._format_sources([
+            {"link": "https://a.com", "snippet": "x" * 1000},
+            {"url": "https://b.com", "snippet": None}
+        ])
+
+        assert "URL: https://a.com" in sources
+        assert "x" * 300 + "\n" in sources
+        assert "x" * 301 not in sources
+        assert "Source 2:\nURL: https://b.com\nSnippet: N/A" in sources
@@ -0,0 +1,40 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.db.repository import save_search_results
+from app.utils.vectors import pack_f16
+
+
+class TestSaveSearchResults:
+    """Test batched persistence of search results"""
+
+    @pytest.fixture
+    def session(self):
+        """Create a mock async session"""
+        return AsyncMock()
+
+    @pytest.mark.asyncio
+    async def test_single_insert_for_all_rows(self, session):
+        """Test that every result is written by one execute call"""
+        results = [
+            {"title": "A", "url": "https://a.com", "snippet": "a", "score": 0.9},
+            {"title": "B", "url": "https://b.com", "snippet": "b", "embedding_b16": pack_f16([0.5, -0.25])}
+        ]
+
+        await save_search_results(session, "test", results)
+
+        session.execute.assert_awaited_once()
+        rows = session.execute.call_args[0][1]
+        assert [row["url"] for row in rows] == ["https://a.com", "https://b.com"]
+        assert rows[0]["query"] == "test"
+        assert rows[0]["embedding"] is None
+        assert rows[1]["score"] == 0.0
+        assert rows[1]["embedding"] == [0.5, -0.25]
+        session.commit.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_empty_results_skip_database(self, session):
+        """Test that no statement is issued for an empty result list"""
+        await save_search_results(session, "test", [])
+
+        session.execute.assert_not_called()
+        session.commit.assert_not_called()
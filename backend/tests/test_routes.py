@@ -92,6 +92,20 @@ class TestSearchEndpoint:
         assert response.status_code == 422
 
 
+class TestHttpClientDependency:
+    """Test the shared outbound HTTP client dependency"""
+
+    @pytest.mark.asyncio
+    async def test_get_http_client_returns_app_client(self):
+        """Test that handlers receive the client stored on app.state"""
+        from app.api.routes import get_http_client
+
+        request = MagicMock()
+        request.app.state.http_client = sentinel = MagicMock()
+
+        assert await get_http_client(request) is sentinel
+
+
 class TestGetTaskStatus:
     """Test GET /tasks/{task_id} endpoint"""
 
@@ -109,7 +123,7 @@ class TestGetTaskStatus:
             data = response.json()
             assert data["task_id"] == "test-task-123"
             assert data["status"] == "pending"
-            assert data["result"] is None
+            assert "result" not in data
 
     def test_get_task_completed_success(self):
         """Test getting status of completed successful task"""
@@ -142,7 +156,232 @@ class TestGetTaskStatus:
             assert data["status"] == "completed"
             assert data["result"] is not None
             assert data["result"]["query"] == "python"
-            assert data["error"] is None
+            assert "error" not in data
+
+    def test_get_task_status_only_skips_result(self):
+        """Test that status_only polls never load the task result"""
+        with patch("app.api.routes.AsyncResult") as mock_async_result:
+            mock_result = MagicMock()
+            mock_result.status = "SUCCESS"
+            mock_result.ready.return_value = True
+            mock_result.successful.return_value = True
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123?status_only=true")
+
+            assert response.status_code == 200
+            assert response.json() == {"task_id": "test-task-123", "status": "completed"}
+            mock_result.get.assert_not_called()
+
+    def _pubsub(self):
+        pubsub = MagicMock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.get_message = AsyncMock(return_value=None)
+        pubsub.aclose = AsyncMock()
+        return pubsub
+
+    def test_get_task_wait_holds_until_ready(self):
+        """Test that a long-poll rechecks readiness on each notification"""
+        pubsub = self._pubsub()
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client:
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.status = "SUCCESS"
+            mock_result.ready.side_effect = [False, False, True, True]
+            mock_result.successful.return_value = True
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123?status_only=true&wait=5")
+
+            assert response.status_code == 200
+            assert response.json()["status"] == "completed"
+            assert mock_result.ready.call_count == 3
+            pubsub.subscribe.assert_awaited_once_with("task:test-task-123")
+            assert pubsub.get_message.await_count == 2
+            pubsub.aclose.assert_awaited_once()
+
+    def test_get_task_wait_polls_without_pubsub(self):
+        """Test that a long-poll falls back to polling when Redis pub/sub fails"""
+        pubsub = self._pubsub()
+        pubsub.subscribe.side_effect = Exception("Redis down")
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client, \
+             patch("app.api.routes.TASK_WAIT_INTERVAL", 0.001):
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.status = "SUCCESS"
+            mock_result.ready.side_effect = [False, True]
+            mock_result.successful.return_value = True
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123?status_only=true&wait=5")
+
+            assert response.json()["status"] == "completed"
+            assert mock_result.ready.call_count == 2
+
+    def test_get_task_wait_times_out_pending(self):
+        """Test that a long-poll reports pending once the wait elapses"""
+        pubsub = self._pubsub()
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client:
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.status = "PENDING"
+            mock_result.ready.return_value = False
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123?status_only=true&wait=0.01")
+
+            assert response.status_code == 200
+            assert response.json()["status"] == "pending"
+
+    def test_get_task_wait_is_capped(self):
+        """Test that waits beyond MAX_TASK_WAIT are rejected"""
+        response = client.get("/tasks/test-task-123?wait=3600")
+
+        assert response.status_code == 422
+
+    def test_stream_task_waits_for_notification(self):
+        """Test that the stream emits one event once the task is ready"""
+        pubsub = self._pubsub()
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client:
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.status = "SUCCESS"
+            mock_result.ready.side_effect = [False, True, True]
+            mock_result.successful.return_value = True
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123/stream?status_only=true")
+
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            assert response.text == 'data: {"task_id":"test-task-123","status":"completed"}\n\n'
+            pubsub.subscribe.assert_awaited_once_with("task:test-task-123")
+            pubsub.get_message.assert_awaited_once()
+            pubsub.aclose.assert_awaited_once()
+
+    def test_stream_task_falls_back_without_pubsub(self):
+        """Test that a Redis failure degrades to polling readiness"""
+        pubsub = self._pubsub()
+        pubsub.subscribe.side_effect = Exception("Redis down")
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client, \
+             patch("app.api.routes.TASK_WAIT_INTERVAL", 0.001):
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.status = "FAILURE"
+            mock_result.ready.side_effect = [False, True, True]
+            mock_result.successful.return_value = False
+            mock_result.result = Exception("boom")
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123/stream")
+
+            assert response.text == 'data: {"task_id":"test-task-123","status":"failed","error":"boom"}\n\n'
+            pubsub.aclose.assert_awaited_once()
+
+    def test_stream_task_reports_backend_failure_while_waiting(self):
+        """Test that a result backend failure during the wait still yields a failed frame"""
+        pubsub = self._pubsub()
+        pubsub.subscribe.side_effect = Exception("Redis down")
+        pubsub.aclose.side_effect = Exception("Redis down")
+        with patch("app.api.routes.AsyncResult") as mock_async_result, \
+             patch("app.api.routes.get_pubsub_client") as mock_client:
+            mock_client.return_value.pubsub.return_value = pubsub
+            mock_result = MagicMock()
+            mock_result.ready.side_effect = Exception("database down")
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123/stream")
+
+            assert response.status_code == 200
+            assert response.text.startswith('data: {"task_id":"test-task-123","status":"failed","error":')
+            assert response.text.count("data: ") == 1
+
+    def test_get_task_completed_expands_embeddings(self):
+        """Test that packed float16 embeddings are returned as float lists"""
+        from app.utils.vectors import pack_f16
+
+        with patch("app.api.routes.AsyncResult") as mock_async_result:
+            mock_result = MagicMock()
+            mock_result.status = "SUCCESS"
+            mock_result.ready.return_value = True
+            mock_result.successful.return_value = True
+            mock_result.get.return_value = {
+                "query": "python",
+                "organic_results": [
+                    {
+                        "title": "Python.org",
+                        "url": "https://python.org",
+                        "snippet": "Official Python website",
+                        "embedding_b16": pack_f16([0.5, -0.25])
+                    }
+                ],
+                "formatted_output": "",
+                "token_estimate": 150,
+                "expand_embeddings": True
+            }
+            mock_async_result.return_value = mock_result
+
+            response = client.get("/tasks/test-task-123")
+
+            result = response.json()["result"]
+            assert result["organic_results"][0]["embedding"] == [0.5, -0.25]
+            assert "embedding_b16" not in result["organic_results"][0]
+            assert "expand_embeddings" not in result
+
+    def _completed_with_vectors(self, mock_async_result, vectors, precision):
+        from app.utils.vectors import pack_f16
+
+        mock_result = MagicMock()
+        mock_result.status = "SUCCESS"
+        mock_result.ready.return_value = True
+        mock_result.successful.return_value = True
+        mock_result.get.return_value = {
+            "query": "python",
+            "organic_results": [
+                {"title": "T", "url": "https://t.com", "snippet": "s", "embedding_b16": pack_f16(vec)}
+                for vec in vectors
+            ],
+            "formatted_output": "",
+            "token_estimate": 150,
+            "embedding_precision": precision
+        }
+        mock_async_result.return_value = mock_result
+
+    def test_get_task_completed_int8_embeddings(self):
+        """Test that int8 embeddings share one scale and decode close to the originals"""
+        import base64
+        import numpy as np
+
+        vectors = [[0.5, -0.25, 0.0], [-1.0, 1.0, 0.25]]
+        with patch("app.api.routes.AsyncResult") as mock_async_result:
+            self._completed_with_vectors(mock_async_result, vectors, "int8")
+
+            results = client.get("/tasks/test-task-123").json()["result"]["organic_results"]
+
+            for res, vec in zip(results, vectors):
+                q = res["embedding_q"]
+                values = np.frombuffer(base64.b64decode(q["values"]), dtype=np.int8)
+                decoded = (values.astype(np.float32) + 128) * q["scale"] + q["zero_point"]
+                assert np.allclose(decoded, vec, atol=q["scale"])
+                assert "embedding_b16" not in res
+            assert results[0]["embedding_q"]["scale"] == results[1]["embedding_q"]["scale"]
+
+    def test_get_task_completed_binary_embeddings(self):
+        """Test that binary embeddings are packed sign bits"""
+        import base64
+
+        with patch("app.api.routes.AsyncResult") as mock_async_result:
+            self._completed_with_vectors(mock_async_result, [[0.5, -0.25, 0.0, 1.0]], "binary")
+
+            res = client.get("/tasks/test-task-123").json()["result"]["organic_results"][0]
+
+            assert base64.b64decode(res["embedding_q"]["values"]) == bytes([0b10010000])
+            assert "scale" not in res["embedding_q"]
 
     def test_get_task_failed_with_error(self):
         """Test getting status of failed task"""
@@ -298,3 +298,40 @@ class TestTaskResponseSchema:
 
         assert response.result is not None
         assert response.error is not None
+
+    def test_task_response_serialization_drops_nulls(self):
+        """Test that to_dict/to_json omit unset optional fields"""
+        response = TaskResponse(task_id="task-1", status="pending")
+
+        assert response.to_dict() == {"task_id": "task-1", "status": "pending"}
+        assert response.to_json() == '{"task_id":"task-1","status":"pending"}'
+
+    def test_search_response_ignores_unknown_keys(self):
+        """Test that extra keys from worker results are dropped"""
+        response = SearchResponse(
+            query="test",
+            formatted_output="output",
+            token_estimate=1,
+            cached=False,
+            internal_field="ignored"  # type: ignore
+        )
+
+        assert "internal_field" not in response.to_dict()
+
+    def test_search_response_from_trusted_matches_validated(self):
+        """Test that unvalidated construction serializes like the validated model"""
+        data = {
+            "query": "test",
+            "organic_results": [
+                {"title": "A", "url": "https://a.com", "snippet": "a", "full_content": None, "extra": 1},
+                {"title": "B", "url": "https://b.com", "snippet": "b", "score": 0.5,
+                 "embedding_q": {"values": "AAE=", "scale": 0.1, "zero_point": -1.0}}
+            ],
+            "formatted_output": "output",
+            "token_estimate": 1,
+            "internal_field": "ignored"
+        }
+
+        trusted = SearchResponse.from_trusted(data, cached=False)
+
+        assert trusted.to_dict() == SearchResponse(**data, cached=False).to_dict()
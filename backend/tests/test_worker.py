@@ -1,39 +1,53 @@
 import pytest
-from unittest.mock import MagicMock, patch, AsyncMock
-from app.worker import scrape_task, embed_task
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch, AsyncMock, DEFAULT
+from app.worker import scrape_task, embed_task, score_task
 from app.worker import celery_app
 import celery.exceptions
 import httpx
+import numpy as np
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+@pytest.fixture
+def worker_mocks():
+    """Patch every collaborator of the worker tasks in one go"""
+    init_db = MagicMock(side_effect=_noop)
+    with patch.multiple(
+        "app.worker",
+        scraper=DEFAULT,
+        parser=DEFAULT,
+        formatter=DEFAULT,
+        embeddings_service=DEFAULT,
+        save_search_results=DEFAULT,
+        cache=DEFAULT,
+        AsyncSessionLocal=DEFAULT,
+        llm_judge=DEFAULT,
+        init_db=init_db
+    ) as mocks:
+        yield SimpleNamespace(init_db=init_db, **mocks)
 
 
 class TestWorkerTask:
     """Test Celery worker tasks"""
 
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.save_search_results")
-    @patch("app.worker.cache")
-    @patch("app.worker.init_db")
-    @patch("app.worker.AsyncSessionLocal")
-
-    def test_scrape_task_search_mode(
-        self, mock_session, mock_init, mock_cache, mock_save, mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+    def test_scrape_task_search_mode(self, worker_mocks):
         """Test scrape_task in search mode"""
-        mock_cache.get.return_value = None
+        worker_mocks.cache.get.return_value = None
 
-        mock_scraper.fetch_results = AsyncMock(return_value=[
+        worker_mocks.scraper.fetch_results = AsyncMock(return_value=[
             {"title": "Result", "url": "https://result.com", "snippet": "Test"}
         ])
 
-        mock_parser.parse.return_value = {
+        worker_mocks.parser.parse.return_value = {
             "ai_overview": "Overview",
             "organic_results": [{"title": "Result", "url": "https://result.com", "snippet": "Test"}]
         }
 
-        mock_formatter.format_response.return_value = {
+        worker_mocks.formatter.format_response.return_value = {
             "query": "test",
             "ai_overview": "Overview",
             "organic_results": [{"title": "Result", "url": "https://result.com"}],
@@ -41,40 +55,26 @@ class TestWorkerTask:
             "token_estimate": 100
         }
 
-        mock_embeddings.generate.return_value = [[0.1, 0.2, 0.3]]
-
-        mock_init_db = AsyncMock()
-        mock_init.side_effect = lambda: mock_init_db()
+        worker_mocks.embeddings_service.generate.return_value = [[0.1, 0.2, 0.3]]
 
-        result = scrape_task.apply(args=["python", "us", "en", 10, "search"]).get()
+        result = scrape_task.apply(args=["python", "us", "en", 10, "search"]).result
 
         assert result is not None
         assert "organic_results" in result
         assert result["query"] == "python"
 
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.save_search_results")
-    @patch("app.worker.cache")
-    @patch("app.worker.init_db")
-    @patch("app.worker.AsyncSessionLocal")
-
-    def test_scrape_task_scrape_mode(
-        self, mock_session, mock_init, mock_cache, mock_save, mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+    def test_scrape_task_scrape_mode(self, worker_mocks):
         """Test scrape_task in scrape mode"""
-        mock_cache.get.return_value = None
+        worker_mocks.cache.get.return_value = None
 
-        mock_scraper.scrape_url = AsyncMock(return_value="<html>content</html>")
+        worker_mocks.scraper.scrape_url = AsyncMock(return_value="<html>content</html>")
 
-        mock_parser.parse_url_content.return_value = {
+        worker_mocks.parser.parse_url_content.return_value = {
             "ai_overview": "Scraped",
             "organic_results": [{"title": "Scraped", "url": "https://example.com"}]
         }
 
-        mock_formatter.format_response.return_value = {
+        worker_mocks.formatter.format_response.return_value = {
             "query": "https://example.com",
             "ai_overview": "Scraped",
             "organic_results": [{"title": "Scraped", "url": "https://example.com"}],
@@ -82,46 +82,24 @@ class TestWorkerTask:
             "token_estimate": 50
         }
 
-        mock_embeddings.generate.return_value = [[0.1, 0.2]]
-
-        mock_init_db = AsyncMock()
-        mock_init.side_effect = lambda: mock_init_db()
+        worker_mocks.embeddings_service.generate.return_value = [[0.1, 0.2]]
 
-        result = scrape_task.apply(args=["https://example.com", "us", "en", 10, "scrape"]).get()
+        result = scrape_task.apply(args=["https://example.com", "us", "en", 10, "scrape"]).result
 
         assert result is not None
         assert "organic_results" in result
 
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.cache")
-    def test_scrape_task_cached_result(
-        self, mock_cache, mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+    def test_scrape_task_cached_result(self, worker_mocks):
         """Test scrape_task returns cached result"""
         cached_result = {"query": "python", "cached": True}
-        mock_cache.get.return_value = cached_result
+        worker_mocks.cache.get.return_value = cached_result
 
-        result = scrape_task.apply(args=["python", "us", "en", 10, "search"]).get()
+        result = scrape_task.apply(args=["python", "us", "en", 10, "search"]).result
 
         assert result == cached_result
-        mock_scraper.fetch_results.assert_not_called()
-
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.save_search_results")
-    @patch("app.worker.cache")
-    @patch("app.worker.init_db")
-    @patch("app.worker.AsyncSessionLocal")
-
-    def test_embed_task_with_vectors(
-        self, mock_session, mock_init, mock_cache, mock_save,
-        mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+        worker_mocks.scraper.fetch_results.assert_not_called()
+
+    def test_embed_task_with_vectors(self, worker_mocks):
         """Test embed_task with vector output"""
         # Input result from step 1
         input_result = {
@@ -129,75 +107,185 @@ class TestWorkerTask:
              "organic_results": [{"title": "Result", "snippet": "Snippet text"}]
         }
 
-        mock_embeddings.generate.return_value = [[0.1, 0.2, 0.3, 0.4, 0.5]]
-
-        mock_init_db = AsyncMock()
-        mock_init.side_effect = lambda: mock_init_db()
+        worker_mocks.embeddings_service.generate_array.return_value = np.array([[0.1, 0.2, 0.3, 0.4, 0.5]], dtype=np.float16)
 
-        result = embed_task.apply(args=[input_result, "us", "en", 10, "vector"]).get()
+        result = embed_task.apply(args=[input_result, "us", "en", 10, "vector"]).result
 
         assert result is not None
-        assert result["organic_results"][0].get("embedding") is not None
-
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.save_search_results")
-    @patch("app.worker.cache")
-    @patch("app.worker.init_db")
-    @patch("app.worker.AsyncSessionLocal")
-
-    def test_scrape_task_error_handling(
-        self, mock_session, mock_init, mock_cache, mock_save,
-        mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+        assert result["organic_results"][0].get("embedding_b16") is not None
+        assert result["expand_embeddings"] is True
+
+    def test_embed_task_with_b16_vectors(self, worker_mocks):
+        """Test embed_task packs float16 vectors for vector_b16 output"""
+        from app.utils.vectors import unpack_f16
+
+        input_result = {
+             "query": "test",
+             "organic_results": [{"title": "Result", "snippet": "Snippet text"}]
+        }
+        worker_mocks.embeddings_service.generate_array.return_value = np.array([[0.5, -0.25]], dtype=np.float16)
+
+        result = embed_task.apply(args=[input_result, "us", "en", 10, "vector_b16"]).result
+
+        res = result["organic_results"][0]
+        assert "embedding" not in res
+        assert unpack_f16(res["embedding_b16"]) == [0.5, -0.25]
+        assert result["expand_embeddings"] is False
+
+    def test_embed_task_skips_empty_snippets(self, worker_mocks):
+        """Test embed_task only encodes results that have snippet text"""
+        input_result = {
+             "query": "test",
+             "organic_results": [{"title": "Empty", "snippet": " "}, {"title": "Result", "snippet": "Snippet text"}]
+        }
+        worker_mocks.embeddings_service.generate_array.return_value = np.array([[0.5, -0.25]], dtype=np.float16)
+
+        result = embed_task.apply(args=[input_result, "us", "en", 10, "vector"]).result
+
+        worker_mocks.embeddings_service.generate_array.assert_called_once_with(["Snippet text"])
+        assert "embedding_b16" not in result["organic_results"][0]
+        assert result["organic_results"][1].get("embedding_b16") is not None
+
+    @pytest.mark.parametrize("first, second", [("vector", "vector_int8"), ("vector_int8", "vector_b16"), ("vector", "search")])
+    def test_embed_task_cache_hit_uses_current_format(self, worker_mocks, first, second):
+        """Test that a cached result from one output format does not leak into another"""
+        import orjson
+
+        store = {}
+        worker_mocks.cache.set.side_effect = lambda query, data, *args: store.update({query: orjson.dumps(data)})
+        worker_mocks.cache.get.side_effect = lambda query, *args: orjson.loads(store[query]) if query in store else None
+        worker_mocks.embeddings_service.generate_array.return_value = np.array([[0.5, -0.25]], dtype=np.float16)
+
+        embed_task.run({"query": "test", "organic_results": [{"title": "Result", "snippet": "Snippet text"}]},
+                       "us", "en", 10, first)
+        cached = scrape_task.run("test", "us", "en", 10, "search")
+        result = embed_task.run(cached, "us", "en", 10, second)
+
+        assert "expand_embeddings" not in orjson.loads(store["test"])
+        res = result["organic_results"][0]
+        if second == "vector_int8":
+            assert result["embedding_precision"] == "int8"
+            assert "expand_embeddings" not in result
+        elif second == "vector_b16":
+            assert result["expand_embeddings"] is False
+            assert "embedding_precision" not in result
+        else:
+            assert "embedding_b16" not in res
+            assert "expand_embeddings" not in result and "embedding_precision" not in result
+
+    def test_embed_task_marks_quantized_precision(self, worker_mocks):
+        """Test embed_task leaves int8 quantization to the API for vector_int8 output"""
+        input_result = {
+             "query": "test",
+             "organic_results": [{"title": "Result", "snippet": "Snippet text"}]
+        }
+        worker_mocks.embeddings_service.generate_array.return_value = np.array([[0.5, -0.25]], dtype=np.float16)
+
+        result = embed_task.apply(args=[input_result, "us", "en", 10, "vector_int8"]).result
+
+        assert result["organic_results"][0].get("embedding_b16") is not None
+        assert result["embedding_precision"] == "int8"
+        assert "expand_embeddings" not in result
+
+    def test_scrape_task_error_handling(self, worker_mocks):
         """Test scrape_task error handling"""
-        mock_cache.get.side_effect = Exception("Cache error")
+        worker_mocks.cache.get.side_effect = Exception("Cache error")
 
         # Verify that the exception propagates (so Celery can handle it/fail the task)
         with pytest.raises(Exception, match="Cache error"):
-            scrape_task.apply(args=["test", "us", "en", 10, "search"]).get()
-
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.cache")
-    def test_scrape_task_fetch_fails(
-        self, mock_cache, mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+            scrape_task.run("test", "us", "en", 10, "search")
+
+    def test_scrape_task_fetch_fails(self, worker_mocks):
         """Test scrape_task when fetch returns None"""
-        mock_cache.get.return_value = None
-        mock_scraper.fetch_results = AsyncMock(return_value=None)
+        worker_mocks.cache.get.return_value = None
+        worker_mocks.scraper.fetch_results = AsyncMock(return_value=None)
 
         # Verify that the task retries (Celery raises Retry exception locally)
         with pytest.raises(celery.exceptions.Retry):
-            scrape_task.apply(args=["test", "us", "en", 10, "search"]).get()
-
-    @patch("app.worker.scraper")
-    @patch("app.worker.parser")
-    @patch("app.worker.formatter")
-    @patch("app.worker.embeddings_service")
-    @patch("app.worker.save_search_results")
-    @patch("app.worker.cache")
-    @patch("app.worker.init_db")
-    @patch("app.worker.AsyncSessionLocal")
-
-    def test_embed_task_database_error_logged(
-        self, mock_session, mock_init, mock_cache, mock_save,
-        mock_embeddings, mock_formatter, mock_parser, mock_scraper
-    ):
+            scrape_task.apply(args=["test", "us", "en", 10, "search"]).result
+
+    def test_embed_task_database_error_logged(self, worker_mocks):
         """Test embed_task logs database errors"""
         input_result = {
              "query": "test",
              "organic_results": [{"title": "Result", "snippet": "Snippet text"}]
         }
 
-        mock_init_db = AsyncMock(side_effect=Exception("DB init error"))
-        mock_init.side_effect = lambda: mock_init_db()
+        worker_mocks.init_db.side_effect = Exception("DB init error")
 
-        result = embed_task.apply(args=[input_result, "us", "en", 10, "json"]).get()
+        with patch("app.worker._db_ready", False):
+            result = embed_task.apply(args=[input_result, "us", "en", 10, "json"]).result
 
         assert result is not None
         assert "organic_results" in result
+        worker_mocks.save_search_results.assert_not_called()
+
+    def test_score_task_uses_combined_judge_call(self, worker_mocks):
+        """Test score_task fills both scores from a single judge call"""
+        worker_mocks.llm_judge.evaluate_both = AsyncMock(return_value={
+            "relevance": {"score": 0.9, "reasoning": "Relevant"},
+            "credibility": {"score": 0.6, "reasoning": "Mixed sources"}
+        })
+        input_result = {
+            "query": "test",
+            "organic_results": [{"title": "Result", "url": "https://a.com", "snippet": "Snippet"}]
+        }
+
+        result = score_task.apply(args=[input_result]).result
+
+        assert result["relevance_score"] == 0.9
+        assert result["credibility_score"] == 0.6
+        assert result["credibility_reasoning"] == "Mixed sources"
+        worker_mocks.llm_judge.evaluate_both.assert_awaited_once()
+
+    def test_score_task_publishes_completion(self, worker_mocks):
+        """Test that finishing score_task notifies stream listeners"""
+        worker_mocks.llm_judge.evaluate_both = AsyncMock(return_value={
+            "relevance": {"score": 0.9, "reasoning": "Relevant"},
+            "credibility": {"score": 0.6, "reasoning": "Mixed sources"}
+        })
+
+        score_task.apply(args=[{"query": "test", "organic_results": []}], task_id="abc")
+        scrape_task.apply(args=["test", "us", "en", 10, "search"], task_id="xyz")
+
+        worker_mocks.cache.publish.assert_called_once_with("task:abc", "done")
+
+    def test_scrape_task_enrichment_skips_urlless_results(self, worker_mocks):
+        """Test deep-scrape content lands on the result whose URL was scraped"""
+        worker_mocks.cache.get.return_value = None
+        worker_mocks.scraper.fetch_results = AsyncMock(return_value={"results": []})
+        worker_mocks.scraper.scrape_multiple_urls = AsyncMock(return_value=["<html>page</html>"])
+        worker_mocks.parser.parse.return_value = {"ai_overview": None, "organic_results": []}
+        worker_mocks.parser.parse_url_content.return_value = {
+            "organic_results": [{"snippet": "Full page text that is long"}]
+        }
+        worker_mocks.formatter.format_response.return_value = {
+            "query": "test",
+            "ai_overview": None,
+            "organic_results": [
+                {"title": "No URL", "snippet": "a"},
+                {"title": "With URL", "url": "https://b.com", "snippet": "b"}
+            ],
+            "formatted_output": "F",
+            "token_estimate": 1
+        }
+
+        result = scrape_task.apply(args=["test", "us", "en", 10, "search"]).result
+
+        first, second = result["organic_results"]
+        assert "full_content" not in first
+        assert second["full_content"] == "Full page text that is long"
+        assert second["snippet"] == "Full page text that is long..."
+        worker_mocks.scraper.scrape_multiple_urls.assert_awaited_once_with(["https://b.com"])
+
+    def test_orjson_serializer_round_trip(self):
+        """Test that chain payloads survive the orjson kombu codec"""
+        from kombu.serialization import dumps, loads
+        from app.worker import celery_app
+
+        payload = {"query": "test", "organic_results": [{"title": "T", "score": 0.5}]}
+        content_type, encoding, body = dumps(payload, serializer="orjson")
+
+        assert celery_app.conf.task_serializer == "orjson"
+        assert content_type == "application/x-orjson"
+        assert loads(body, content_type, encoding, accept=["application/x-orjson"]) == payload
@@ -8,21 +8,24 @@ async def verify_rate_limit():
 
     print("Starting Rate Limit Verification...")
 
-    success_count = 0
-    blocked_count = 0
-
-    async with httpx.AsyncClient() as client:
-        for i in range(1, 11):
-            try:
-                response = await client.post(url, json=payload)
-                print(f"Request {i}: Status {response.status_code}")
-
-                if response.status_code == 202:
-                    success_count += 1
-                elif response.status_code == 429:
-                    blocked_count += 1
-            except Exception as e:
-                print(f"Request {i} failed: {e}")
+    # Fire the whole burst at once so the limiter sees concurrent requests
+    limits = httpx.Limits(max_keepalive_connections=10, max_connections=10)
+    async with httpx.AsyncClient(limits=limits) as client:
+        responses = await asyncio.gather(
+            *(client.post(url, json=payload) for _ in range(10)),
+            return_exceptions=True
+        )
+
+    results_log = [
+        f"Request {i} failed: {response}" if isinstance(response, BaseException)
+        else f"Request {i}: Status {response.status_code}"
+        for i, response in enumerate(responses, start=1)
+    ]
+    print("\n".join(results_log))
+
+    statuses = [r.status_code for r in responses if not isinstance(r, BaseException)]
+    success_count = statuses.count(202)
+    blocked_count = statuses.count(429)
 
     print("\nResults:")
     print(f"Successful requests: {success_count}")
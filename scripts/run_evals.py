@@ -1,22 +1,145 @@
 import asyncio
-import json
+import hashlib
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+import orjson
 import time
 import os
+import re
+import random
+import textwrap
 import httpx
-import statistics
-from typing import List, Dict, Any, Optional
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-API_URL = "http://localhost:8000/search"
+# Gateway paths are relative to the shared client's base_url
+GATEWAY_URL = os.getenv("GATEWAY_URL", "http://localhost:8000")
+API_URL = "/search"
+TASKS_URL = "/tasks"
 DATASET_PATH = "backend/tests/evals/dataset.json"
+RESULTS_PATH = "backend/tests/evals/last_run_results_llm.json"
+# Per-query results streamed during a run; removed once RESULTS_PATH is written
+CHECKPOINT_PATH = "backend/tests/evals/last_run_results_llm.ndjson"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+JUDGE_TIMEOUT = 30.0
+# Snippet tails add prompt tokens without changing the verdict
+MAX_SNIPPET_CHARS = 300
+# Concurrent OpenRouter requests from the judge, and its requests-per-minute budget
+JUDGE_CONCURRENCY = 3
+JUDGE_RPM = int(os.getenv("JUDGE_RPM", "20"))
+# Queries judged per OpenRouter request, and how long a partial batch waits to fill
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", "5"))
+JUDGE_BATCH_LINGER = 1.0
+JUDGE_CACHE_DIR = os.getenv("JUDGE_CACHE_DIR", ".judge_cache")
+JUDGE_CACHE_TTL = 7 * 24 * 60 * 60
+# Concurrent /search submissions, sized to the gateway's rate limit
+SUBMIT_CONCURRENCY = 5
+# Same settings the gateway's limiter reads, so sends are paced to its window
+RATE_LIMIT_TIMES = int(os.getenv("RATE_LIMIT_TIMES", "5"))
+RATE_LIMIT_SECONDS = float(os.getenv("RATE_LIMIT_SECONDS", "60"))
+# Task polling: long-poll up to LONG_POLL_WAIT seconds per request, back off from
+# POLL_INITIAL_DELAY to POLL_MAX_DELAY after errors, give up after POLL_TIMEOUT seconds
+LONG_POLL_WAIT = 25.0
+POLL_INITIAL_DELAY = 0.05
+POLL_MAX_DELAY = 2.0
+POLL_TIMEOUT = 60.0
+MAX_TRANSIENT_ERRORS = 5
+JSON_HEADERS = {"Content-Type": "application/json"}
+TOKEN_PATTERN = re.compile(r"\w+")
+# Spans the outermost braces/brackets so a stray ``` inside a JSON string can't cut the body short
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(\{.*\}|\[.*\])", re.S)
+
+class SlidingWindowPacer:
+    """Async rate limiter: acquire() waits until fewer than `times` calls fall in the last `seconds`."""
+
+    def __init__(self, times: int, seconds: float):
+        self.times = times
+        self.seconds = seconds
+        self._sent: deque = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.seconds:
+                self._sent.popleft()
+            if len(self._sent) >= self.times:
+                await asyncio.sleep(self.seconds - (now - self._sent.popleft()))
+            self._sent.append(time.monotonic())
+
+SUBMIT_PACER = SlidingWindowPacer(RATE_LIMIT_TIMES, RATE_LIMIT_SECONDS)
 
 class LLMJudge:
-    def __init__(self, api_key: str, model_name: str = "meta-llama/llama-3-8b-instruct:free"):
+    # Prompt templates are dedented once at class creation instead of sending the
+    # inline f-strings' source indentation to the model on every call
+    RELEVANCE_SYSTEM = "You are an expert search relevance judge. Output ONLY valid JSON."
+    RELEVANCE_PROMPT = textwrap.dedent("""\
+        Task: Evaluate the OVERALL quality of the search snippets for the query.
+
+        User Query: "{query}"
+
+        Search Snippets:
+        {snippets}
+
+        Instructions:
+        1. Analyze if snippets answer the query.
+        2. Assign a score 0.0 (irrelevant) to 1.0 (perfect).
+        3. Provide reasoning.
+        4. Output JSON: {{ "score": <float>, "reasoning": "<string>" }}""")
+
+    CREDIBILITY_SYSTEM = "You are an expert information quality judge. Output ONLY valid JSON."
+    CREDIBILITY_PROMPT = textwrap.dedent("""\
+        Task: Evaluate the CREDIBILITY of the sources.
+
+        User Query: "{query}"
+
+        Sources:
+        {sources}
+
+        Instructions:
+        1. Analyze URLs (domain authority) and content quality.
+        2. Assign score 0.0 (low trust) to 1.0 (high trust/academic/news).
+        3. Provide reasoning.
+        4. Output JSON: {{ "score": <float>, "reasoning": "<string>" }}""")
+
+    COMBINED_SYSTEM = "You are an expert search relevance and information quality judge. Output ONLY valid JSON."
+    COMBINED_PROMPT = textwrap.dedent("""\
+        Task: Evaluate the search results on two axes:
+        RELEVANCE (do the snippets answer the query?) and CREDIBILITY (how trustworthy are the sources?).
+
+        User Query: "{query}"
+
+        Sources:
+        {sources}
+
+        Instructions:
+        1. Assign a relevance score 0.0 (irrelevant) to 1.0 (perfect).
+        2. Assign a credibility score 0.0 (low trust) to 1.0 (high trust/academic/news), using URLs (domain authority) and content quality.
+        3. Provide reasoning for each.
+        4. Output JSON: {{ "relevance": {{ "score": <float>, "reasoning": "<string>" }}, "credibility": {{ "score": <float>, "reasoning": "<string>" }} }}""")
+
+    BATCH_PROMPT = textwrap.dedent("""\
+        Task: For EACH query below, evaluate its search results on two axes:
+        RELEVANCE (do the snippets answer the query?) and CREDIBILITY (how trustworthy are the sources?).
+
+        Queries (one JSON object per line):
+        {queries}
+
+        Instructions:
+        1. Assign a relevance score 0.0 (irrelevant) to 1.0 (perfect).
+        2. Assign a credibility score 0.0 (low trust) to 1.0 (high trust/academic/news), using URLs (domain authority) and content quality.
+        3. Provide brief reasoning for each.
+        4. Output JSON: {{ "results": [ {{ "index": <int>, "relevance": {{ "score": <float>, "reasoning": "<string>" }}, "credibility": {{ "score": <float>, "reasoning": "<string>" }} }} ] }} with one entry per query index.""")
+
+    def __init__(self, api_key: str, model_name: str = "meta-llama/llama-3-8b-instruct:free",
+                 client: Optional[httpx.AsyncClient] = None):
         self.api_key = api_key
         self.model_name = model_name
         self.headers = {
@@ -25,63 +148,148 @@ class LLMJudge:
             "HTTP-Referer": "http://localhost:8000", # Required by OpenRouter for some tiers
             "X-Title": "Flux Search Evals"
         }
+        # One pooled client for every judge call so OpenRouter connections stay warm;
+        # a caller-supplied client is shared with the search phase and not closed here
+        self._owns_client = client is None
+        self.cache_dir = Path(JUDGE_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Real OpenRouter requests issued (cache hits excluded)
+        self.api_calls = 0
+        # Caps concurrent OpenRouter requests; retries back off outside the limit
+        self._sem = asyncio.Semaphore(JUDGE_CONCURRENCY)
+        self._pacer = SlidingWindowPacer(JUDGE_RPM, 60)
+        # Epoch time before which no request is sent, from OpenRouter's rate-limit headers
+        self._resume_at = 0.0
+        self._client = client or httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+        )
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> "LLMJudge":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
 
-    async def _call_api(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        """Helper to call OpenRouter API with retries"""
+    def _cache_path(self, key: Dict[str, Any]) -> Path:
+        # model_name is part of every key, so switching judges never reuses stale verdicts
+        digest = hashlib.sha256(orjson.dumps(key, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    @staticmethod
+    def _cache_read(path: Path) -> Optional[Dict[str, Any]]:
+        # Entries older than JUDGE_CACHE_TTL are re-judged and overwritten
+        try:
+            if time.time() - path.stat().st_mtime < JUDGE_CACHE_TTL:
+                return orjson.loads(path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            pass
+        return None
+
+    @staticmethod
+    def _is_verdict(result: Any) -> bool:
+        return isinstance(result, dict) and "score" in result
+
+    @staticmethod
+    def _is_combined_verdict(result: Any) -> bool:
+        return (isinstance(result, dict) and isinstance(result.get("relevance"), dict)
+                and isinstance(result.get("credibility"), dict))
+
+    async def _call_api(self, messages: List[Dict[str, str]], max_tokens: int = 1000,
+                        cache_if: Optional[Callable[[Any], bool]] = None) -> Dict[str, Any]:
+        """Helper to call OpenRouter API with retries.
+
+        Replies are read from and written to the disk cache only when `cache_if`
+        accepts them, so an off-schema reply is never replayed on later runs.
+        """
         payload = {
             "model": self.model_name,
             "messages": messages,
             "response_format": {"type": "json_object"},
-            "max_tokens": 1000
+            "max_tokens": max_tokens
         }
-        
+
+        # The judge is deterministic for a given model and prompt, so reruns
+        # read verdicts from disk instead of spending rate-limited API calls
+        cache_path = self._cache_path(payload) if cache_if else None
+        if cache_path:
+            cached = self._cache_read(cache_path)
+            if cached is not None and cache_if(cached):
+                return cached
+
+        # Encode the prompt payload once with orjson rather than per attempt via httpx's stdlib json
+        body = orjson.dumps(payload)
         retries = 3
         base_delay = 5
 
-        async with httpx.AsyncClient() as client:
-            for attempt in range(retries + 1):
-                try:
-                    response = await client.post(
-                        OPENROUTER_URL, 
-                        headers=self.headers, 
-                        json=payload, 
-                        timeout=30.0
+        for attempt in range(retries + 1):
+            try:
+                # Wait out an exhausted quota window instead of spending a request on a 429
+                pause = self._resume_at - time.time()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                # Spend the per-minute budget evenly rather than bursting into 429s
+                await self._pacer.acquire()
+                async with self._sem:
+                    self.api_calls += 1
+                    response = await self._client.post(
+                        OPENROUTER_URL, content=body, headers=self.headers, timeout=JUDGE_TIMEOUT
                     )
-                    
-                    if response.status_code == 200:
-                        content = response.json()["choices"][0]["message"]["content"]
+                reset_at = rate_limit_reset_at(response)
+                if reset_at is not None:
+                    self._resume_at = max(self._resume_at, reset_at)
+
+                if response.status_code == 200:
+                    content = orjson.loads(response.content)["choices"][0]["message"]["content"]
+                    try:
+                        # json_object mode usually returns bare JSON; only fall back
+                        # to extracting a markdown-fenced body when that fails
                         try:
-                            # Clean up potential markdown code blocks
-                            if "```json" in content:
-                                content = content.split("```json")[1].split("```")[0].strip()
-                            elif "```" in content:
-                                content = content.split("```")[1].split("```")[0].strip()
-                                
-                            result = json.loads(content)
-                            if isinstance(result, list):
-                                return result[0] if result else {"score": 0.0, "reasoning": "Empty list"}
-                            return result
-                        except json.JSONDecodeError:
-                            return {"score": 0.0, "reasoning": f"JSON Decode Error: {content[:100]}"}
-                    
-                    elif response.status_code == 429:
-                        wait_time = base_delay * (attempt + 1)
-                        print(f"OpenRouter 429 Rate Limit. Retrying in {wait_time}s...")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    else:
-                        print(f"OpenRouter Error {response.status_code}: {response.text}")
-                        return {"score": 0.0, "reasoning": f"API Error: {response.status_code}"}
-                        
-                except Exception as e:
-                    print(f"Request Error: {e}")
-                    if attempt < retries:
-                        await asyncio.sleep(base_delay)
-                        continue
-                    return {"score": 0.0, "reasoning": f"Exception: {str(e)}"}
-        
+                            result = orjson.loads(content)
+                        except orjson.JSONDecodeError:
+                            fence = FENCE_PATTERN.search(content)
+                            if not fence:
+                                raise
+                            content = fence.group(1)
+                            result = orjson.loads(content)
+                        if isinstance(result, list):
+                            result = result[0] if result else {"score": 0.0, "reasoning": "Empty list"}
+                        if cache_path and cache_if(result):
+                            cache_path.write_bytes(orjson.dumps(result))
+                        return result
+                    except orjson.JSONDecodeError:
+                        return {"score": 0.0, "reasoning": f"JSON Decode Error: {content[:100]}"}
+
+                elif response.status_code == 429:
+                    wait_time = max(retry_after_seconds(response) or 0.0, backoff(attempt, base=base_delay))
+                    print(f"OpenRouter 429 Rate Limit. Retrying in {wait_time:.1f}s...")
+                    await asyncio.sleep(wait_time)
+                    continue
+                else:
+                    print(f"OpenRouter Error {response.status_code}: {response.text}")
+                    return {"score": 0.0, "reasoning": f"API Error: {response.status_code}"}
+
+            except Exception as e:
+                print(f"Request Error: {e}")
+                if attempt < retries:
+                    await asyncio.sleep(base_delay)
+                    continue
+                return {"score": 0.0, "reasoning": f"Exception: {str(e)}"}
+
         return {"score": 0.0, "reasoning": "Max retries exceeded"}
 
+    @staticmethod
+    def _sources_json(results: List[Dict[str, Any]]) -> str:
+        # Compact JSON keeps judge input tokens down versus a pretty-printed or prose listing
+        return orjson.dumps([
+            {"url": res.get("link", "N/A"), "snippet": (res.get("snippet") or "N/A")[:MAX_SNIPPET_CHARS]}
+            for res in results
+        ]).decode()
+
     async def evaluate(self, query: str, snippets: List[str]) -> Dict[str, Any]:
         """
         Evaluates the relevance of snippets to the query using the LLM.
@@ -89,28 +297,16 @@ class LLMJudge:
         if not snippets:
             return {"score": 0.0, "reasoning": "No snippets provided."}
 
-        system_prompt = "You are an expert search relevance judge. Output ONLY valid JSON."
-        user_prompt = f"""
-        Task: Evaluate the OVERALL quality of the search snippets for the query.
-        
-        User Query: "{query}"
-
-        Search Snippets:
-        {json.dumps(snippets, indent=2)}
+        snippets_json = orjson.dumps([(snippet or "")[:MAX_SNIPPET_CHARS] for snippet in snippets]).decode()
+        system_prompt = self.RELEVANCE_SYSTEM
+        user_prompt = self.RELEVANCE_PROMPT.format(query=query, snippets=snippets_json)
 
-        Instructions:
-        1. Analyze if snippets answer the query.
-        2. Assign a score 0.0 (irrelevant) to 1.0 (perfect).
-        3. Provide reasoning.
-        4. Output JSON: {{ "score": <float>, "reasoning": "<string>" }}
-        """
-        
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
         
-        return await self._call_api(messages)
+        return await self._call_api(messages, cache_if=self._is_verdict)
 
     async def evaluate_credibility(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -119,38 +315,238 @@ class LLMJudge:
         if not results:
             return {"score": 0.0, "reasoning": "No results provided."}
 
-        sources_text = []
-        for i, res in enumerate(results):
-            sources_text.append(f"Source {i+1}:\nURL: {res.get('link', 'N/A')}\nSnippet: {res.get('snippet', 'N/A')}\n")
-        
-        sources_str = "\n".join(sources_text)
-
-        system_prompt = "You are an expert information quality judge. Output ONLY valid JSON."
-        user_prompt = f"""
-        Task: Evaluate the CREDIBILITY of the sources.
+        system_prompt = self.CREDIBILITY_SYSTEM
+        user_prompt = self.CREDIBILITY_PROMPT.format(query=query, sources=self._sources_json(results))
 
-        User Query: "{query}"
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
 
-        Sources:
-        {sources_str}
+        return await self._call_api(messages, cache_if=self._is_verdict)
 
-        Instructions:
-        1. Analyze URLs (domain authority) and content quality.
-        2. Assign score 0.0 (low trust) to 1.0 (high trust/academic/news).
-        3. Provide reasoning.
-        4. Output JSON: {{ "score": <float>, "reasoning": "<string>" }}
+    async def evaluate_combined(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Evaluates relevance and credibility of the sources in a single request.
         """
+        if not results:
+            empty = {"score": 0.0, "reasoning": "No results provided."}
+            return {"relevance": empty, "credibility": empty}
+
+        system_prompt = self.COMBINED_SYSTEM
+        user_prompt = self.COMBINED_PROMPT.format(query=query, sources=self._sources_json(results))
 
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
+        result = await self._call_api(messages, cache_if=self._is_combined_verdict)
+        if not isinstance(result, dict):
+            result = {}
+
+        relevance = result.get("relevance")
+        credibility = result.get("credibility")
+        if isinstance(relevance, dict) and isinstance(credibility, dict):
+            return {"relevance": relevance, "credibility": credibility}
+
+        # The combined reply didn't match the schema (or the call failed), so
+        # judge only the missing axes with the single-purpose prompts
+        if not isinstance(relevance, dict) and not isinstance(credibility, dict):
+            relevance, credibility = await asyncio.gather(
+                self.evaluate(query, [res.get("snippet", "") for res in results]),
+                self.evaluate_credibility(query, results)
+            )
+        elif not isinstance(relevance, dict):
+            relevance = await self.evaluate(query, [res.get("snippet", "") for res in results])
+        else:
+            credibility = await self.evaluate_credibility(query, results)
+        return {"relevance": relevance, "credibility": credibility}
+
+    async def evaluate_batch(self, items: List[Tuple[str, List[Dict[str, Any]]]]) -> List[Dict[str, Dict[str, Any]]]:
+        """
+        Evaluates relevance and credibility for several (query, results) pairs in one request.
+        """
+        verdicts: List[Optional[Dict[str, Dict[str, Any]]]] = [None] * len(items)
+        # Verdicts are cached per item, so reruns hit regardless of how batches were grouped
+        paths = [
+            self._cache_path({"model": self.model_name, "kind": "batch-item", "query": query,
+                              "sources": self._sources_json(results)})
+            for query, results in items
+        ]
+        for i, (path, (_, results)) in enumerate(zip(paths, items)):
+            if not results:
+                empty = {"score": 0.0, "reasoning": "No results provided."}
+                verdicts[i] = {"relevance": empty, "credibility": empty}
+            else:
+                verdicts[i] = self._cache_read(path)
+
+        missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        if missing:
+            queries_str = "\n".join(
+                f'{{"index":{i},"query":{orjson.dumps(items[i][0]).decode()},"sources":{self._sources_json(items[i][1])}}}'
+                for i in missing
+            )
+            system_prompt = self.COMBINED_SYSTEM
+            user_prompt = self.BATCH_PROMPT.format(queries=queries_str)
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            result = await self._call_api(messages, max_tokens=400 * len(missing))
+
+            # Error results from _call_api are exactly {score, reasoning}; apply them to every item
+            if isinstance(result, dict) and set(result) == {"score", "reasoning"}:
+                for i in missing:
+                    verdicts[i] = {"relevance": result, "credibility": result}
+                return verdicts  # type: ignore[return-value]
+
+            entries = result.get("results") if isinstance(result, dict) else None
+            if not isinstance(entries, list):
+                # A bare list is unwrapped to its first entry by _call_api
+                entries = [result] if isinstance(result, dict) and "index" in result else []
+            by_index = {e.get("index"): e for e in entries if isinstance(e, dict)}
+
+            malformed = []
+            for i in missing:
+                entry = by_index.get(i, {})
+                relevance, credibility = entry.get("relevance"), entry.get("credibility")
+                if isinstance(relevance, dict) and isinstance(credibility, dict):
+                    verdicts[i] = {"relevance": relevance, "credibility": credibility}
+                    paths[i].write_bytes(orjson.dumps(verdicts[i]))
+                else:
+                    malformed.append(i)
+
+            # The model answered off-schema, or dropped or mangled some items; judge those singly
+            singles = await asyncio.gather(*(self.evaluate_combined(*items[i]) for i in malformed))
+            for i, verdict in zip(malformed, singles):
+                verdicts[i] = verdict
+
+        return verdicts  # type: ignore[return-value]
 
-        return await self._call_api(messages)
+class JudgeBatcher:
+    """Collects concurrent per-query judge requests and sends them as evaluate_batch calls."""
 
+    def __init__(self, judge: LLMJudge, size: int, linger: float):
+        self.judge = judge
+        self.size = size
+        self.linger = linger
+        self._pending: List[Tuple[str, List[Dict[str, Any]], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+        # (query, sources) -> verdict future, so duplicate pairs in a run share one judgement
+        self._memo: Dict[Tuple[str, str], asyncio.Future] = {}
 
+    async def evaluate(self, query: str, results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        key = (query, LLMJudge._sources_json(results))
+        if key in self._memo:
+            return await self._memo[key]
+        future = self._memo[key] = asyncio.get_running_loop().create_future()
+        self._pending.append((query, results, future))
+        if len(self._pending) >= self.size:
+            self._flush()
+        elif self._timer is None:
+            # A partial batch waits at most `linger` seconds for company
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
 
-async def run_query(client: httpx.AsyncClient, question: Dict[str, Any]) -> Dict[str, Any]:
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[str, List[Dict[str, Any]], asyncio.Future]]) -> None:
+        try:
+            verdicts = await self.judge.evaluate_batch([(query, results) for query, results, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), verdict in zip(batch, verdicts):
+            future.set_result(verdict)
+
+
+
+@dataclass(slots=True)
+class EvalResult:
+    """Outcome of one eval query; scores are filled in after the search phase."""
+    id: Any
+    query: str
+    status: str
+    latency: float
+    result_count: int = 0
+    error_code: Optional[int] = None
+    error_msg: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    heuristic_score: float = 0.0
+    llm_score: float = 0.0
+    llm_reasoning: Optional[str] = None
+    credibility_score: float = 0.0
+    credibility_reasoning: Optional[str] = None
+
+# Payload hash -> task_id for submissions still being polled, so a repeated
+# query reattaches to the in-flight task instead of creating another
+SUBMITTED_TASKS: Dict[str, str] = {}
+
+def payload_key(payload: Dict[str, Any]) -> str:
+    return hashlib.blake2b(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+def backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff: uniform over [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds to wait."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def rate_limit_reset_at(response: httpx.Response) -> Optional[float]:
+    """Epoch seconds when the quota refills if X-RateLimit-Remaining says it is exhausted."""
+    if response.headers.get("X-RateLimit-Remaining") != "0":
+        return None
+    try:
+        reset = float(response.headers["X-RateLimit-Reset"])
+    except (KeyError, ValueError):
+        return None
+    # OpenRouter sends epoch milliseconds; accept epoch seconds or a delta too
+    if reset > 1e12:
+        return reset / 1000
+    return reset if reset > 1e9 else time.time() + reset
+
+async def stream_task(client: httpx.AsyncClient, task_url: str, deadline: float) -> Optional[Dict[str, Any]]:
+    """Waits on the gateway's SSE task stream; returns the finished task, or None to fall back to polling."""
+    try:
+        async with client.stream(
+            "GET",
+            f"{task_url}/stream",
+            timeout=httpx.Timeout(max(0.0, deadline - time.time()) + 10.0, connect=2.0)
+        ) as response:
+            if response.status_code != 200:
+                return None
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    task_data = orjson.loads(line[6:])
+                    return task_data if task_data["status"] in ("completed", "failed") else None
+    except (httpx.HTTPError, orjson.JSONDecodeError, KeyError, TypeError):
+        # Dropped connections and malformed or partial frames fall back to long-polling
+        pass
+    return None
+
+async def run_query(client: httpx.AsyncClient, question: Dict[str, Any], sem: asyncio.Semaphore) -> EvalResult:
     start_time = time.time()
     payload = {
         "query": question["query"],
@@ -160,87 +556,154 @@ async def run_query(client: httpx.AsyncClient, question: Dict[str, Any]) -> Dict
     }
     
     retries = 3
-    # Step 1: Submit Task
-    task_id = None
-    for attempt in range(retries):
+    server_errors = 0
+    # Step 1: Submit Task (skipped when the same payload is already in flight).
+    # 429 backs off and retries, a 5xx gets one retry, any other status fails fast.
+    task_key = payload_key(payload)
+    body = orjson.dumps(payload)
+    task_id = SUBMITTED_TASKS.get(task_key)
+    for attempt in range(0 if task_id else retries):
         try:
-            response = await client.post(API_URL, json=payload, timeout=10.0)
+            # Only submissions are throttled; polling runs freely so a slow
+            # task never holds up the next query's submit. The pacer sends
+            # right up to the limit instead of waiting out 429 backoffs.
+            async with sem:
+                await SUBMIT_PACER.acquire()
+                response = await client.post(API_URL, content=body, headers=JSON_HEADERS)
             
             if response.status_code == 202:
-                task_id = response.json()["task_id"]
+                task_id = orjson.loads(response.content)["task_id"]
+                SUBMITTED_TASKS[task_key] = task_id
                 break
             elif response.status_code == 429:
-                wait_time = (2 ** attempt) + 1
-                await asyncio.sleep(wait_time)
+                await asyncio.sleep(max(retry_after_seconds(response) or 0.0, backoff(attempt)))
+                continue
+            elif response.status_code >= 500 and server_errors == 0:
+                server_errors += 1
+                await asyncio.sleep(backoff(attempt))
                 continue
             else:
-                return {
-                    "id": question["id"],
-                    "query": question["query"],
-                    "status": "error",
-                    "error_code": response.status_code,
-                    "latency": time.time() - start_time,
-                    "result_count": 0
-                }
+                return EvalResult(
+                    id=question["id"],
+                    query=question["query"],
+                    status="error",
+                    error_code=response.status_code,
+                    latency=time.time() - start_time
+                )
         except Exception as e:
-            return {
-                "id": question["id"],
-                "query": question["query"],
-                "status": "exception",
-                "error_msg": str(e),
-                "latency": time.time() - start_time,
-                "result_count": 0
-            }
+            return EvalResult(
+                id=question["id"],
+                query=question["query"],
+                status="exception",
+                error_msg=str(e),
+                latency=time.time() - start_time
+            )
 
     if not task_id:
-         return {
-            "id": question["id"],
-            "query": question["query"],
-            "status": "error",
-            "error_code": 429, # Assuming rate limit if no task_id
-            "latency": time.time() - start_time,
-            "result_count": 0
-        }
+         return EvalResult(
+            id=question["id"],
+            query=question["query"],
+            status="error",
+            error_code=429, # Assuming rate limit if no task_id
+            latency=time.time() - start_time
+        )
 
     # Step 2: Poll for Results
-    poll_attempts = 30 # 30 * 2s = 60s max wait
-    for _ in range(poll_attempts):
-        await asyncio.sleep(2)
+    task_url = f"{TASKS_URL}/{task_id}"
+    deadline = time.time() + POLL_TIMEOUT
+    # Push first: one held stream delivers the finished task; long-polling
+    # covers gateways without the stream endpoint and stream failures
+    task_data = await stream_task(client, task_url, deadline)
+    delay = POLL_INITIAL_DELAY
+    # Seconds to sleep before the next poll; None falls back to jittered backoff
+    pause: Optional[float] = 0.0
+    transient_errors = 0
+    while task_data is None and time.time() < deadline:
+        # Jitter keeps concurrent pollers from hitting the API in lockstep;
+        # a Retry-After from a throttled poll overrides the backoff once.
+        await asyncio.sleep(pause if pause is not None else delay * random.uniform(0.5, 1.0))
+        delay = min(POLL_MAX_DELAY, delay * 2)
+        pause = None
         try:
-            status_response = await client.get(f"http://localhost:8000/tasks/{task_id}", timeout=10.0)
-            if status_response.status_code == 200:
-                task_data = status_response.json()
-                if task_data["status"] == "completed":
-                    latency = time.time() - start_time
-                    result = task_data["result"]
-                    return {
-                        "id": question["id"],
-                        "query": question["query"],
-                        "status": "success",
-                        "latency": latency,
-                        "result_count": len(result.get("organic_results", [])),
-                        "data": result
-                    }
-                elif task_data["status"] == "failed":
-                    return {
-                        "id": question["id"],
-                        "query": question["query"],
-                        "status": "error",
-                        "error_msg": task_data.get("error", "Unknown task failure"),
-                        "latency": time.time() - start_time,
-                        "result_count": 0
-                    }
-        except Exception as e:
-             pass # Continue polling on transient callback errors
-             
+            # Long-poll the status-only view (the gateway holds the request until
+            # the task is ready or the wait lapses), then download the body once
+            wait = max(0.0, min(LONG_POLL_WAIT, deadline - time.time()))
+            polled_at = time.time()
+            status_response = await client.get(
+                task_url,
+                params={"status_only": "true", "wait": f"{wait:.1f}"},
+                headers={"Accept-Encoding": "identity"},
+                timeout=httpx.Timeout(wait + 10.0, connect=2.0)
+            )
+            if status_response.status_code != 200:
+                if status_response.status_code == 429:
+                    pause = retry_after_seconds(status_response)
+                continue
+            if orjson.loads(status_response.content)["status"] not in ("completed", "failed"):
+                # If the gateway held the request it already waited server-side,
+                # so re-poll straight away; a quick answer falls back to backoff
+                if time.time() - polled_at >= wait:
+                    pause = 0.0
+                continue
+            task_response = await client.get(task_url)
+            if task_response.status_code != 200:
+                continue
+            task_data = orjson.loads(task_response.content)
+            if task_data["status"] not in ("completed", "failed"):
+                task_data = None
+        except httpx.TransportError as e:
+            # Connection resets and timeouts are retried; anything else is a real bug
+            transient_errors += 1
+            if transient_errors > MAX_TRANSIENT_ERRORS:
+                print(f"Giving up on task {task_id} after {transient_errors} transport errors: {e}")
+                break
+            continue
+        except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+            # A malformed status body fails this query rather than the whole run
+            return EvalResult(
+                id=question["id"],
+                query=question["query"],
+                status="exception",
+                error_msg=f"Malformed task response: {e!r}",
+                latency=time.time() - start_time
+            )
+
+    if task_data is not None and task_data["status"] == "completed":
+        SUBMITTED_TASKS.pop(task_key, None)
+        result = task_data.get("result")
+        if not isinstance(result, dict):
+            return EvalResult(
+                id=question["id"],
+                query=question["query"],
+                status="exception",
+                error_msg="Malformed task response: completed without a result",
+                latency=time.time() - start_time
+            )
+        return EvalResult(
+            id=question["id"],
+            query=question["query"],
+            status="success",
+            latency=time.time() - start_time,
+            result_count=len(result.get("organic_results", [])),
+            data=result
+        )
+    if task_data is not None:
+        SUBMITTED_TASKS.pop(task_key, None)
+        return EvalResult(
+            id=question["id"],
+            query=question["query"],
+            status="error",
+            error_msg=task_data.get("error", "Unknown task failure"),
+            latency=time.time() - start_time
+        )
+
     # Timeout
-    return {
-        "id": question["id"],
-        "query": question["query"],
-        "status": "timeout",
-        "latency": time.time() - start_time,
-        "result_count": 0
-    }
+    return EvalResult(
+        id=question["id"],
+        query=question["query"],
+        status="timeout",
+        latency=time.time() - start_time
+    )
 
 def calculate_heuristic_score(query: str, results: List[Dict[str, Any]]) -> float:
     """
@@ -249,156 +712,165 @@ def calculate_heuristic_score(query: str, results: List[Dict[str, Any]]) -> floa
     if not results:
         return 0.0
     
-    query_terms = set(query.lower().split())
+    query_terms = set(TOKEN_PATTERN.findall(query.lower()))
     if not query_terms:
         return 0.0
-        
-    total_score = 0
+
+    # One tokenization per result, then O(1) set lookups per query term
+    total_matches = 0
     for res in results:
-        text = (res.get("title", "") + " " + res.get("snippet", "")).lower()
-        matches = sum(1 for term in query_terms if term in text)
-        total_score += matches / len(query_terms)
-        
+        text = f"{res.get('title') or ''} {res.get('snippet') or ''}".lower()
+        total_matches += len(query_terms.intersection(TOKEN_PATTERN.findall(text)))
+    total_score = total_matches / len(query_terms)
+
     return min(total_score / len(results), 1.0) 
 
+def load_checkpoint(path: Path) -> Dict[Any, EvalResult]:
+    """Reads successful results left by an interrupted run, keyed by query id."""
+    completed: Dict[Any, EvalResult] = {}
+    if not path.exists():
+        return completed
+    for line in path.read_bytes().splitlines():
+        try:
+            res = EvalResult(**orjson.loads(line))
+        except (orjson.JSONDecodeError, TypeError):
+            continue  # Partial line from a crash mid-write
+        if res.status == "success":
+            completed[res.id] = res
+    return completed
+
+def metric_array(records: List[EvalResult], field: str) -> np.ndarray:
+    """Collects one numeric field across records into a float64 array."""
+    return np.fromiter((getattr(r, field) for r in records), dtype=np.float64, count=len(records))
+
 async def main():
+    # One pooled client for the whole run: search submits, status polls and
+    # judge calls all reuse the same keep-alive connections.
+    client = httpx.AsyncClient(
+        base_url=GATEWAY_URL,
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=30.0),
+        timeout=httpx.Timeout(10.0, connect=2.0),
+        http2=True
+    )
+
     if not OPENROUTER_API_KEY:
         print("WARNING: OPENROUTER_API_KEY not found in .env. Falling back to heuristic scoring ONLY.")
         judge = None
     else:
         print(f"Initializing LLM Judge with model: meta-llama/llama-3-8b-instruct:free (OpenRouter)...")
         try:
-            judge = LLMJudge(api_key=OPENROUTER_API_KEY, model_name="meta-llama/llama-3-8b-instruct:free")
+            judge = LLMJudge(api_key=OPENROUTER_API_KEY, model_name="meta-llama/llama-3-8b-instruct:free", client=client)
         except Exception as e:
             print(f"Failed to initialize LLM Judge: {e}. Falling back to heuristic.")
             judge = None
 
     print(f"Loading dataset from {DATASET_PATH}...")
     try:
-        with open(DATASET_PATH, "r") as f:
-            full_dataset = json.load(f)
-            # DEMO LIMIT: Process only first 10 items to stay within free tier limits quickly
-            dataset = full_dataset[:10] 
-            print(f"DEMO MODE: Processing 10/{len(full_dataset)} queries for rapid verification.")
+        full_dataset = orjson.loads(Path(DATASET_PATH).read_bytes())
+        # DEMO LIMIT: Process only first 10 items to stay within free tier limits quickly
+        dataset = full_dataset[:10] 
+        print(f"DEMO MODE: Processing 10/{len(full_dataset)} queries for rapid verification.")
     except FileNotFoundError:
         print(f"Error: Dataset not found at {DATASET_PATH}")
+        await client.aclose()
         return
 
     print(f"Running evals for {len(dataset)} questions...")
-    
-    results = []
-    # 1. Run Search
-    async with httpx.AsyncClient() as client:
-        tasks = [run_query(client, q) for q in dataset]
-        batch_size = 5
-        for i in range(0, len(tasks), batch_size):
-            batch = tasks[i:i + batch_size]
-            results.extend(await asyncio.gather(*batch))
-            print(f"Search: Processed {min(i + batch_size, len(tasks))}/{len(dataset)} queries...")
-            await asyncio.sleep(1) 
-
-    # 2. Evaluate Results (Scoring)
-    print("\nStarting Evaluation Phase...")
-    evaluated_results = []
-    
-    # Process evaluation sequentially to strictly avoid rate limits
-    eval_batch_size = 1
-    for i in range(0, len(results), eval_batch_size):
-        batch = results[i:i + eval_batch_size]
-        eval_tasks = []
-        
-        for res in batch:
-            if res["status"] == "success":
-                organic_results = res["data"].get("organic_results", [])
-                snippets = [r.get("snippet", "") for r in organic_results]
-                
-                # Heuristic Score (Always calculate as baseline/fallback)
-                heuristic_score = calculate_heuristic_score(res["query"], organic_results)
-                res["heuristic_score"] = heuristic_score
-                
-                if judge:
-                    # Parallel calls for Relevance and Credibility
-                    relevance_task = judge.evaluate(res["query"], snippets)
-                    credibility_task = judge.evaluate_credibility(res["query"], organic_results)
-                    eval_tasks.append(relevance_task)
-                    eval_tasks.append(credibility_task)
-                else:
-                    eval_tasks.append(asyncio.sleep(0, result={"score": heuristic_score, "reasoning": "Heuristic fallback"}))
-                    eval_tasks.append(asyncio.sleep(0, result={"score": 0.0, "reasoning": "No LLM"}))
-            else:
-                # Failed search
-                res["heuristic_score"] = 0.0
-                eval_tasks.append(asyncio.sleep(0, result={"score": 0.0, "reasoning": "Search failed"}))
-                eval_tasks.append(asyncio.sleep(0, result={"score": 0.0, "reasoning": "Search failed"}))
-        
-        # Execute batch evaluation
-        eval_outputs = await asyncio.gather(*eval_tasks)
-        
-        # Merge back (2 outputs per result if judge exists)
-        if judge:
-            # We have 2 * batch_size outputs
-            # Structure: [Rel1, Cred1, Rel2, Cred2, ...]
-            for i, res in enumerate(batch):
-                rel_idx = i * 2
-                cred_idx = i * 2 + 1
-                
-                rel_out = eval_outputs[rel_idx]
-                cred_out = eval_outputs[cred_idx]
-                
-                res["llm_score"] = rel_out.get("score", 0.0)
-                res["llm_reasoning"] = rel_out.get("reasoning", "No description")
-                
-                res["credibility_score"] = cred_out.get("score", 0.0)
-                res["credibility_reasoning"] = cred_out.get("reasoning", "No description")
-                
-                evaluated_results.append(res)
+
+    # Search and evaluation are pipelined: each query joins a judge batch as soon
+    # as its search lands, so judge calls overlap the remaining searches. The
+    # submit semaphore bounds concurrent /search posts and the judge's semaphore
+    # bounds OpenRouter requests; its backoff absorbs any 429s.
+    sem = asyncio.Semaphore(SUBMIT_CONCURRENCY)
+    batcher = JudgeBatcher(judge, JUDGE_BATCH_SIZE, JUDGE_BATCH_LINGER) if judge else None
+
+    # Failed searches and heuristic-only runs need no judge call, so their
+    # verdicts are plain dicts built inline rather than awaited placeholders
+    def local_verdict(res: EvalResult) -> Dict[str, Dict[str, Any]]:
+        if res.status != "success":
+            failed = {"score": 0.0, "reasoning": "Search failed"}
+            return {"relevance": failed, "credibility": failed}
+        # Heuristic score (baseline/fallback) was computed after the search
+        return {
+            "relevance": {"score": res.heuristic_score, "reasoning": "Heuristic fallback"},
+            "credibility": {"score": 0.0, "reasoning": "No LLM"}
+        }
+
+    async def process(index: int, question: Dict[str, Any]):
+        res = await run_query(client, question, sem)
+        if res.status == "success":
+            res.heuristic_score = calculate_heuristic_score(res.query, res.data.get("organic_results", []))
         else:
-            # 2 outputs per result (mock)
-            for i, res in enumerate(batch):
-                rel_idx = i * 2
-                rel_out = eval_outputs[rel_idx]
-                
-                res["llm_score"] = rel_out.get("score", 0.0)
-                res["llm_reasoning"] = rel_out.get("reasoning", "No description")
-                # No credibility for heuristic mode
-                evaluated_results.append(res)
-            
-        print(f"Evaluated {min(i + eval_batch_size, len(results))}/{len(results)} queries...")
+            res.heuristic_score = 0.0
+
+        if batcher and res.status == "success":
+            out = await batcher.evaluate(res.query, res.data.get("organic_results", []))
+        else:
+            out = local_verdict(res)
+        rel_out = out["relevance"]
+        res.llm_score = rel_out.get("score", 0.0)
+        res.llm_reasoning = rel_out.get("reasoning", "No description")
         if judge:
-            await asyncio.sleep(10) # Protect Rate Limits (10s delay between queries)
+            cred_out = out["credibility"]
+            res.credibility_score = cred_out.get("score", 0.0)
+            res.credibility_reasoning = cred_out.get("reasoning", "No description")
+        # No credibility for heuristic mode
+        return index, res
+
+    # Results keep dataset order for the report. Each finished query is appended
+    # to an NDJSON checkpoint, so a crashed run resumes from its successes.
+    checkpoint_path = Path(CHECKPOINT_PATH)
+    resumed = load_checkpoint(checkpoint_path)
+    if resumed:
+        print(f"Resuming: {len(resumed)} queries already completed in {CHECKPOINT_PATH}")
+    evaluated_results: List[Optional[EvalResult]] = [resumed.get(q["id"]) for q in dataset]
+    pending = [process(i, q) for i, q in enumerate(dataset) if evaluated_results[i] is None]
+    with checkpoint_path.open("ab") as checkpoint:
+        for done, next_result in enumerate(asyncio.as_completed(pending), start=1):
+            index, res = await next_result
+            evaluated_results[index] = res
+            checkpoint.write(orjson.dumps(res) + b"\n")
+            checkpoint.flush()
+            print(f"Processed {done}/{len(pending)} queries (search + evaluation)...")
+    if judge:
+        print(f"Judge API calls: {judge.api_calls} (cached verdicts reused for the rest)")
+
+    await client.aclose()
 
     # Aggregation
-    successes = [r for r in evaluated_results if r["status"] == "success"]
-    
-    latencies = [r["latency"] for r in successes]
-    avg_latency = statistics.mean(latencies) if latencies else 0
-    
-    llm_scores = [r["llm_score"] for r in successes]
-    avg_llm_score = statistics.mean(llm_scores) if llm_scores else 0
-    
-    heuristic_scores = [r["heuristic_score"] for r in successes]
-    avg_heuristic_score = statistics.mean(heuristic_scores) if heuristic_scores else 0
+    successes = [r for r in evaluated_results if r.status == "success"]
     
+    latencies = metric_array(successes, "latency")
+    avg_latency = latencies.mean() if latencies.size else 0.0
+
+    llm_scores = metric_array(successes, "llm_score")
+    avg_llm_score = llm_scores.mean() if llm_scores.size else 0.0
+
+    heuristic_scores = metric_array(successes, "heuristic_score")
+    avg_heuristic_score = heuristic_scores.mean() if heuristic_scores.size else 0.0
+
     print("\n" + "="*50)
     print("EVALUATION REPORT (OpenRouter - Nemotron-3 Free)")
     print("="*50)
     print(f"Total Queries:      {len(dataset)}")
     print(f"Success Rate:       {len(successes)}/{len(dataset)} ({len(successes)/len(dataset)*100:.1f}%)")
     print(f"Avg Latency:        {avg_latency:.2f}s")
+    if latencies.size:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"Latency p50/p95/p99: {p50:.2f}s / {p95:.2f}s / {p99:.2f}s")
     print(f"Avg Heuristic:      {avg_heuristic_score:.2f}")
     
-    cred_scores = [r.get("credibility_score", 0.0) for r in successes]
-    avg_cred_score = statistics.mean(cred_scores) if cred_scores else 0
+    cred_scores = metric_array(successes, "credibility_score")
+    avg_cred_score = cred_scores.mean() if cred_scores.size else 0.0
     
     print(f"Avg LLM Relevance:  {avg_llm_score:.2f}")
     print(f"Avg Credibility:    {avg_cred_score:.2f}")
     print("="*50)
 
-    # Save detailed results
-    output_path = "backend/tests/evals/last_run_results_llm.json"
-    with open(output_path, "w") as f:
-        json.dump(evaluated_results, f, indent=2)
-    print(f"Detailed results saved to {output_path}")
+    # Save detailed results; the run finished, so the checkpoint is no longer needed
+    Path(RESULTS_PATH).write_bytes(orjson.dumps(evaluated_results, option=orjson.OPT_INDENT_2))
+    checkpoint_path.unlink(missing_ok=True)
+    print(f"Detailed results saved to {RESULTS_PATH}")
 
 if __name__ == "__main__":
     asyncio.run(main())